@@ -0,0 +1,108 @@
+import json
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import corpus  # Adds the modules of the services to sys.path
+
+import consumer
+from consumer import TopicPartition
+
+"""
+Throughput of the Kafka consumer loop of the services
+
+The loop consumes an in-process topic with a handler that only waits, like
+a service waiting on object storage, for several numbers of batches in
+flight.
+
+    python consumer_loop.py [messages] [work_ms]
+"""
+
+
+FakeMessage = namedtuple('FakeMessage', ['topic', 'partition', 'offset', 'value'])
+
+
+class FakeBroker:
+    """In-process topic with the consumer interface used by ConsumerLoop, for benchmarks"""
+
+    def __init__(self, topic='benchmark', partitions=3):
+        self.topic = topic
+        self.logs = {TopicPartition(topic, p): [] for p in range(partitions)}
+        self.positions = {tp: 0 for tp in self.logs}
+        self.committed = {tp: 0 for tp in self.logs}
+        self.produced = 0
+        self.lock = threading.Lock()
+
+    def produce(self, value):
+        with self.lock:
+            tp = TopicPartition(self.topic, self.produced % len(self.logs))
+            log = self.logs[tp]
+            log.append(FakeMessage(tp.topic, tp.partition, len(log), value))
+            self.produced += 1
+
+    def poll(self, timeout_ms=0, max_records=None):
+        polled = {}
+        remaining = max_records or sys.maxsize
+        with self.lock:
+            for tp, log in self.logs.items():
+                messages = log[self.positions[tp]:self.positions[tp] + remaining]
+                if messages:
+                    polled[tp] = messages
+                    self.positions[tp] += len(messages)
+                    remaining -= len(messages)
+        if not polled:
+            time.sleep(min(timeout_ms, 10) / 1000)
+        return polled
+
+    def commit(self, offsets):
+        with self.lock:
+            for tp, offset in offsets.items():
+                self.committed[tp] = offset.offset
+
+    def seek(self, tp, offset):
+        with self.lock:
+            self.positions[tp] = offset
+
+    def lag(self):
+        with self.lock:
+            return sum(len(log) - self.committed[tp] for tp, log in self.logs.items())
+
+
+SAMPLE_MESSAGE = json.dumps({'Records': [{
+    'eventName': 's3:ObjectCreated:Put',
+    's3': {'bucket': {'name': 'benchmark'}, 'object': {'key': 'object'}},
+}]})
+
+
+def benchmark(messages=5000, work_ms=2, max_poll_records=100, in_flight=(1, 2, 4, 8)):
+    """
+    Throughput of the consumer loop on a fake broker, the handler waits
+    work_ms per batch plus work_ms per record divided by its concurrency,
+    like a service waiting on object storage
+    """
+    def handler(records):
+        time.sleep(work_ms / 1000 * (1 + len(records) / 4))
+
+    results = {}
+    for max_in_flight in in_flight:
+        broker = FakeBroker()
+        for _ in range(messages):
+            broker.produce(SAMPLE_MESSAGE)
+        loop = consumer.ConsumerLoop(broker, handler, max_poll_records=max_poll_records,
+                            poll_timeout_ms=10, max_in_flight=max_in_flight)
+        thread = threading.Thread(target=loop.run)
+        start = time.perf_counter()
+        thread.start()
+        while broker.lag():
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        loop.stop()
+        thread.join()
+        results[max_in_flight] = messages / elapsed
+        print('max_in_flight={}: {:.0f} messages/s'.format(max_in_flight, results[max_in_flight]))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
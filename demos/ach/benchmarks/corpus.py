@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sys
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONTAINERS = os.path.join(HERE, '..', 'containers')
+# Modules shared by the containers, copied next to them in the images
+COMMON = os.path.join(HERE, '..', '..', 'common')
+sys.path[:0] = [COMMON,
+                os.path.join(CONTAINERS, 'RDFI splitter'),
+                os.path.join(CONTAINERS, 'Transactions generator')]
+
+import synthetic
+from ach.writer import AchWriter, LocalFileSink
+from partitioner import load_routing_table
+
+"""
+Seeded NACHA corpora for the benchmarks
+
+Files are generated once with the vectorized entries of the transaction
+generator and kept in a directory, named after their size, variant and
+seed. The same seed gives byte-identical files: the creation date and time
+of the file header and the effective dates of the batches are fixed.
+
+Variants:
+    single   batches as large as allowed, debits only
+    multi    batches of 1000 entries, PPD/CCD/POS, debits and credits
+    addenda  batches of 1000 POS entries, one addenda every other entry
+"""
+
+SEED = 20201001
+VARIANTS = ['single', 'multi', 'addenda']
+
+SETTINGS = {
+    'immediate_dest': '062000019',
+    'immediate_org': '5094142940',
+    'immediate_dest_name': 'BANK OF CHICAGO',
+    'immediate_org_name': 'SEAMLESS CAR LTD',
+    'company_id': '5094142940',
+}
+
+ROUTING_TABLE = os.path.join(CONTAINERS, 'RDFI splitter', 'routing_table.csv')
+
+EFFECTIVE_DATE = datetime(2020, 10, 2)
+# file_crt_date and file_crt_time of the file header
+CREATED = (23, b'2010010000')
+
+
+def corpus_name(entries, variant, seed=SEED):
+    return '{}-{}-{}.ach'.format(variant, entries, seed)
+
+
+def batch_sizes(entries, size):
+    while entries > 0:
+        yield min(entries, size)
+        entries -= size
+
+
+def write_corpus(path, entries, variant, seed=SEED):
+    if variant not in VARIANTS:
+        raise ValueError('unknown corpus variant {}'.format(variant))
+
+    routing_numbers = sorted(load_routing_table(ROUTING_TABLE))
+    vocabulary = synthetic.load_vocabulary(10000, seed)
+    transaction_codes = ('27', '22') if variant == 'multi' else ('27',)
+    generator = synthetic.SyntheticEntries(routing_numbers, vocabulary, seed=seed,
+                                           transaction_codes=transaction_codes)
+
+    with AchWriter(LocalFileSink(path), 'A', SETTINGS) as writer:
+        if variant == 'single':
+            for count in batch_sizes(entries, synthetic.MAX_BATCH_ENTRIES):
+                writer.start_batch('POS', credits=True, debits=True,
+                                   eff_ent_date=EFFECTIVE_DATE)
+                generator.write(writer, count)
+
+        elif variant == 'multi':
+            for index, count in enumerate(batch_sizes(entries, 1000)):
+                writer.start_batch(['PPD', 'CCD', 'POS'][index % 3], credits=True,
+                                   debits=True, eff_ent_date=EFFECTIVE_DATE)
+                generator.write(writer, count)
+
+        else:
+            for count in batch_sizes(entries, 1000):
+                writer.start_batch('POS', credits=True, debits=True,
+                                   eff_ent_date=EFFECTIVE_DATE)
+                records = generator.records(generator.draw(count))
+                for index, record in enumerate(records):
+                    if index % 2:
+                        record['addenda'] = [{'payment_related_info': 'INVOICE {}'.format(index)}]
+                    writer.add_entry(record)
+
+    # The header was rendered with the current date and time
+    with open(path, 'r+b') as f:
+        f.seek(CREATED[0])
+        f.write(CREATED[1])
+
+
+def load_corpus(directory, entries, variant, seed=SEED):
+    """
+    Returns the path of a corpus, generated if it is not in directory yet
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, corpus_name(entries, variant, seed))
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        write_corpus(partial, entries, variant, seed)
+        os.replace(partial, path)
+    return path
+
+
+def digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+if __name__ == '__main__':
+    for entries in [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]:
+        for variant in VARIANTS:
+            path = load_corpus(os.path.join(HERE, 'corpus'), entries, variant)
+            print(path, digest(path))
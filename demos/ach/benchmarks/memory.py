@@ -0,0 +1,233 @@
+import io
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+"""
+In-memory stand-ins of the object storage and of the helper database
+
+MemoryS3 has the boto3 S3 client methods used by the services and delivers
+the bucket notifications, SQLitePool has the interface of the MySQL pool
+used by helper_db. They are injected with storage.use() and helper_db.use()
+to run the services locally, without Ceph or MySQL.
+
+    storage.use(MemoryS3())
+    helper_db.use(SQLitePool())
+"""
+
+
+class NoSuchKey(Exception):
+    """Raised like the botocore ClientError of a missing object"""
+
+    def __init__(self, name):
+        super().__init__('NoSuchKey: ' + name)
+        self.response = {'Error': {'Code': 'NoSuchKey', 'Message': name}}
+
+
+class MemoryS3(object):
+    """
+    In-memory buckets with the boto3 S3 client methods used by the services
+
+    Buckets are created on first write. Each created object is notified to
+    the listeners whose prefix matches its bucket name, with a record in the
+    format of the bucket notifications.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.uploads = {}
+        self.listeners = []
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def subscribe(self, bucket_prefix, callback):
+        """
+        Calls callback(record) for each object created in the buckets whose
+        name starts with bucket_prefix, in the thread that created it
+        """
+        self.listeners.append((bucket_prefix, callback))
+
+    def store(self, bucket, key, data, event):
+        with self.lock:
+            self.buckets.setdefault(bucket, {})[key] = (data, time.time())
+
+        record = {
+            'eventName': 's3:ObjectCreated:' + event,
+            's3': {
+                'bucket': {'name': bucket},
+                'object': {'key': key, 'size': len(data)},
+            },
+        }
+        for bucket_prefix, callback in self.listeners:
+            if bucket.startswith(bucket_prefix):
+                callback(record)
+
+    def load(self, bucket, key):
+        with self.lock:
+            try:
+                return self.buckets[bucket][key][0]
+            except KeyError:
+                raise NoSuchKey('{}/{}'.format(bucket, key))
+
+    def response(self, **fields):
+        fields['ResponseMetadata'] = {'HTTPStatusCode': 200}
+        return fields
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self.calls['put_object'] += 1
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif not isinstance(Body, (bytes, bytearray)):
+            Body = Body.read()
+        self.store(Bucket, Key, bytes(Body), 'Put')
+        return self.response(ETag='"{}"'.format(len(Body)))
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self.calls['upload_fileobj'] += 1
+        self.store(Bucket, Key, Fileobj.read(), 'Put')
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self.calls['get_object'] += 1
+        data = self.load(Bucket, Key)
+        if Range:
+            # bytes=first-last, both included
+            first, last = Range.split('=', 1)[1].split('-')
+            data = data[int(first):int(last) + 1 if last else None]
+        return self.response(Body=io.BytesIO(data), ContentLength=len(data))
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls['head_object'] += 1
+        return self.response(ContentLength=len(self.load(Bucket, Key)))
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.calls['delete_object'] += 1
+        with self.lock:
+            self.buckets.get(Bucket, {}).pop(Key, None)
+        return self.response()
+
+    def copy_object(self, CopySource, Bucket, Key, **kwargs):
+        self.calls['copy_object'] += 1
+        self.store(Bucket, Key, self.load(CopySource['Bucket'], CopySource['Key']), 'Copy')
+        return self.response()
+
+    def copy(self, CopySource, Bucket, Key, ExtraArgs=None, Callback=None,
+             SourceClient=None, Config=None):
+        self.calls['copy'] += 1
+        self.store(Bucket, Key, self.load(CopySource['Bucket'], CopySource['Key']), 'Copy')
+
+    def list_objects(self, Bucket, Prefix='', **kwargs):
+        self.calls['list_objects'] += 1
+        with self.lock:
+            contents = [{'Key': key, 'Size': len(data)}
+                        for key, (data, created) in sorted(self.buckets.get(Bucket, {}).items())
+                        if key.startswith(Prefix)]
+        return self.response(Contents=contents, KeyCount=len(contents))
+
+    list_objects_v2 = list_objects
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls['create_multipart_upload'] += 1
+        with self.lock:
+            upload_id = str(len(self.uploads) + 1)
+            self.uploads[upload_id] = {}
+        return self.response(Bucket=Bucket, Key=Key, UploadId=upload_id)
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.calls['upload_part'] += 1
+        with self.lock:
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+        return self.response(ETag='"{}-{}"'.format(UploadId, PartNumber))
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.calls['complete_multipart_upload'] += 1
+        with self.lock:
+            parts = self.uploads.pop(UploadId)
+        data = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        self.store(Bucket, Key, data, 'CompleteMultipartUpload')
+        return self.response(Bucket=Bucket, Key=Key)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.calls['abort_multipart_upload'] += 1
+        with self.lock:
+            self.uploads.pop(UploadId, None)
+        return self.response()
+
+    def count_objects(self, bucket_prefix=''):
+        with self.lock:
+            return sum(len(objects) for bucket, objects in self.buckets.items()
+                       if bucket.startswith(bucket_prefix))
+
+
+class SQLitePool(object):
+    """
+    Stand-in for the MySQL pool, backed by one SQLite connection used by one
+    transaction at a time. The %s placeholders, the CURRENT_TIMESTAMP() and
+    the INSERT IGNORE of the MySQL statements are translated.
+    """
+
+    def __init__(self, database=':memory:'):
+        self.cnx = sqlite3.connect(database, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        self.lock.acquire()
+        return SQLiteConnection(self)
+
+
+class SQLiteConnection(object):
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, prepared=False):
+        return SQLiteCursor(self.pool.cnx.cursor())
+
+    def commit(self):
+        self.pool.cnx.commit()
+
+    def rollback(self):
+        self.pool.cnx.rollback()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool, pool = None, self.pool
+            pool.lock.release()
+
+
+class SQLiteCursor(object):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @staticmethod
+    def translate(query):
+        return (query.replace('%s', '?').replace('CURRENT_TIMESTAMP()', 'CURRENT_TIMESTAMP')
+                .replace('INSERT IGNORE', 'INSERT OR IGNORE'))
+
+    @staticmethod
+    def adapt(params):
+        return tuple(str(value) if isinstance(value, Decimal) else
+                     value.isoformat(' ') if isinstance(value, datetime) else value
+                     for value in params)
+
+    def execute(self, query, params=()):
+        self.cursor.execute(self.translate(query), self.adapt(params))
+
+    def executemany(self, query, rows):
+        self.cursor.executemany(self.translate(query), [self.adapt(row) for row in rows])
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
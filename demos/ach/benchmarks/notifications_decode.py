@@ -0,0 +1,62 @@
+import json
+import time
+
+import corpus  # Adds the modules of the services to sys.path
+
+import notifications
+
+"""
+Decoding cost of the bucket notifications, eval() against
+notifications.decode()
+
+    python notifications_decode.py
+"""
+
+
+SAMPLE_RECORD = {
+    'eventVersion': '2.2',
+    'eventSource': 'ceph:s3',
+    'awsRegion': 'us-east-1',
+    'eventTime': '2020-10-01T12:00:00.000000Z',
+    'eventName': 's3:ObjectCreated:Put',
+    'userIdentity': {'principalId': 'ach'},
+    'requestParameters': {'sourceIPAddress': ''},
+    'responseElements': {'x-amz-request-id': 'tx0000000000000000001',
+                         'x-amz-id-2': '1234-my-store-my-store'},
+    's3': {
+        's3SchemaVersion': '1.0',
+        'configurationId': 'odfi-split',
+        'bucket': {'name': 'ach-merchant-upload',
+                   'ownerIdentity': {'principalId': 'ach'},
+                   'arn': 'arn:aws:s3:::ach-merchant-upload', 'id': ''},
+        'object': {'key': '0b8e2d1c-3f5a-4d7e-9a61-2c4f8b9e1d3a.ach',
+                   'size': 40000, 'etag': '', 'versionId': '',
+                   'sequencer': '', 'metadata': [], 'tags': []},
+    },
+    'eventId': '', 'opaqueData': '',
+}
+
+
+def benchmark(records_per_event=1, events=20000):
+    """
+    Prints the decoding cost per event, eval() against decode()
+    """
+    body = json.dumps({'Records': [SAMPLE_RECORD] * records_per_event}).encode('utf-8')
+
+    start = time.perf_counter()
+    for _ in range(events):
+        eval(body.decode('utf-8'))['Records'][0]
+    eval_cost = (time.perf_counter() - start) / events
+
+    start = time.perf_counter()
+    for _ in range(events):
+        notifications.decode(body)
+    decode_cost = (time.perf_counter() - start) / events
+
+    print('{} record(s) per event, eval: {:.1f}us, decode ({}): {:.1f}us'.format(
+        records_per_event, eval_cost * 1e6, notifications.loads.__module__, decode_cost * 1e6))
+
+
+if __name__ == '__main__':
+    for records_per_event in (1, 10):
+        benchmark(records_per_event)
@@ -0,0 +1,301 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+
+import corpus
+
+sys.path[3:3] = [os.path.join(corpus.CONTAINERS, 'ODFI splitter'),
+                 os.path.join(corpus.CONTAINERS, 'RDFI processor')]
+
+import aggregation
+import helper_db
+import load_generator
+import memory
+import odfi_split
+import rdfi_process
+import rdfi_split
+import storage
+import transaction_generator
+
+"""
+Local end-to-end run of the ACH pipeline
+
+The transaction generator, the ODFI splitter, the RDFI splitter and the
+RDFI processor run in this process on an in-memory object storage
+(memory.MemoryS3) and an in-memory SQLite helper database, without Ceph,
+MySQL, Kafka or Knative. Each object created in a bucket is notified to the
+stage subscribed to it, which hands the notification records to the
+run_event() of its service, like the KafkaSource does.
+
+    python pipeline.py [--rate 20] [--duration 30] [--output report.json]
+
+The report gives, for each stage, its throughput and the percentiles of
+the time from the creation of an object to the end of its processing
+(latency, queue included) and of the run_event() calls (service). The run
+fails (exit status 1) if files are left in a bucket or if the final
+balance is not the sum of the generated files.
+"""
+
+# Buckets listened to by each stage, in pipeline order
+STAGES = [
+    ('odfi_split', 'ach-merchant-upload', odfi_split.run_event),
+    ('rdfi_split', 'ach-odfi-', rdfi_split.run_event),
+    ('rdfi_process', 'ach-rdfi-', rdfi_process.run_event),
+]
+
+SCHEMA = [
+    'CREATE TABLE bank_balance(time TIMESTAMP, balance DECIMAL(12,2))',
+    'CREATE TABLE balance_ledger(id TINYINT PRIMARY KEY, balance DECIMAL(12,2) NOT NULL)',
+    'CREATE TABLE balance_files(name VARCHAR(255) PRIMARY KEY)',
+    'CREATE TABLE merchant_upload(time TIMESTAMP, entry INT(5))',
+    'CREATE TABLE odfi_split(time TIMESTAMP, entry INT(5))',
+    'CREATE TABLE rdfi_split(time TIMESTAMP, entry INT(5))',
+    'CREATE TABLE rdfi_process(time TIMESTAMP, entry INT(5))',
+    'INSERT INTO balance_ledger(id,balance) VALUES (1, 0)',
+]
+
+
+def percentiles(values, prefix):
+    if not values:
+        return {}
+    values = np.array(values)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+    return {
+        prefix + '_p50_ms': round(p50 * 1000, 1),
+        prefix + '_p90_ms': round(p90 * 1000, 1),
+        prefix + '_p99_ms': round(p99 * 1000, 1),
+        prefix + '_max_ms': round(float(values.max()) * 1000, 1),
+    }
+
+
+class Stage(object):
+    """
+    A service fed with the notifications of the buckets matching a prefix,
+    its workers pass up to batch_size queued records to each run_event()
+    """
+
+    def __init__(self, name, run_event, workers=4, batch_size=10):
+        self.name = name
+        self.run_event = run_event
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.service_times = []
+        self.processed = 0
+        self.failed = 0
+        self.events = 0
+        self.first = None
+        self.last = None
+        self.threads = []
+
+    def notify(self, record):
+        self.queue.put((time.perf_counter(), record))
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.run, daemon=True,
+                                      name='{}-{}'.format(self.name, index))
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.handle(items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def handle(self, items):
+        created = {'{}/{}'.format(record['s3']['bucket']['name'], record['s3']['object']['key']): received
+                   for received, record in items}
+        start = time.perf_counter()
+        try:
+            report = self.run_event([record for received, record in items])
+        except Exception as e:
+            logging.error('{}: {}'.format(self.name, e))
+            report = {'processed': {}, 'failed': created}
+        end = time.perf_counter()
+
+        with self.lock:
+            self.events += 1
+            self.service_times.append(end - start)
+            self.processed += len(report['processed'])
+            self.failed += len(report['failed'])
+            self.latencies.extend(end - created[name] for name in report['processed']
+                                  if name in created)
+            self.first = min(self.first or start, start)
+            self.last = end
+
+    def join(self):
+        self.queue.join()
+
+    def report(self):
+        with self.lock:
+            elapsed = (self.last - self.first) if self.first else 0
+            report = {
+                'events': self.events,
+                'records': self.processed,
+                'failed': self.failed,
+                'records_per_second': round(self.processed / elapsed, 2) if elapsed else 0.0,
+            }
+            report.update(percentiles(self.latencies, 'latency'))
+            report.update(percentiles(self.service_times, 'service'))
+        return report
+
+
+class UploadTotals(object):
+    """
+    Sums the net amount of the files written to the merchant upload bucket,
+    read as they are created, before the ODFI splitter moves them
+    """
+
+    def __init__(self, s3):
+        self.s3 = s3
+        self.lock = threading.Lock()
+        self.files = 0
+        self.cents = 0
+
+    def notify(self, record):
+        data = self.s3.load(record['s3']['bucket']['name'], record['s3']['object']['key'])
+        net = aggregation.aggregate(io.BytesIO(data))['net']
+        with self.lock:
+            self.files += 1
+            self.cents += net
+
+
+def setup():
+    """
+    Replaces the object storage and the helper database of the services,
+    configured when they were imported
+    """
+    s3 = memory.MemoryS3()
+    storage.use(s3)
+    helper_db.use(memory.SQLitePool())
+    for statement in SCHEMA:
+        helper_db.execute(statement)
+    return s3
+
+
+def counts():
+    def statements(cursor):
+        totals = {}
+        for table in ['merchant_upload', 'odfi_split', 'rdfi_split', 'rdfi_process']:
+            cursor.execute('SELECT COALESCE(SUM(entry), 0) FROM {}'.format(table))
+            totals[table] = int(cursor.fetchone()[0])
+        cursor.execute('SELECT balance FROM balance_ledger WHERE id = 1')
+        totals['balance'] = str(Decimal(str(cursor.fetchone()[0])).quantize(Decimal('0.01')))
+        return totals
+    return helper_db.run(statements)
+
+
+def run(target_rate, duration, workers=4, batch_size=10, generator_workers=4,
+        entries_min=300, entries_max=500, seed=corpus.SEED):
+    s3 = setup()
+    uploads = UploadTotals(s3)
+    s3.subscribe('ach-merchant-upload', uploads.notify)
+
+    stages = []
+    for name, bucket_prefix, run_event in STAGES:
+        stage = Stage(name, run_event, workers=workers, batch_size=batch_size)
+        s3.subscribe(bucket_prefix, stage.notify)
+        stage.start()
+        stages.append(stage)
+
+    pools = load_generator.EntryPools([bank[0][0:8] for bank in transaction_generator.banks],
+                                      transaction_generator.names.get_full_name, seed=seed)
+    entry_count = load_generator.EntryCount(entries_min, entries_max, seed=seed)
+    generator = load_generator.LoadGenerator(transaction_generator.generate_file, pools,
+                                             entry_count, target_rate=target_rate,
+                                             workers=generator_workers, duration=duration,
+                                             report_interval=duration or 10)
+
+    start = time.perf_counter()
+    generated = generator.run()
+    # Each stage is drained before the next one, which it feeds
+    for stage in stages:
+        stage.join()
+    elapsed = time.perf_counter() - start
+
+    for module in [odfi_split, rdfi_split, rdfi_process]:
+        module.metrics_writer.flush()
+    totals = counts()
+    expected = str((Decimal(uploads.cents) / 100).quantize(Decimal('0.01')))
+    left = {prefix: s3.count_objects(prefix) for name, prefix, run_event in STAGES}
+
+    failures = []
+    if totals['balance'] != expected:
+        failures.append('balance {}, expected {}'.format(totals['balance'], expected))
+    for prefix, count in left.items():
+        if count:
+            failures.append('{} object(s) left in {}*'.format(count, prefix))
+    for stage in stages:
+        if stage.failed:
+            failures.append('{} record(s) failed in {}'.format(stage.failed, stage.name))
+
+    return {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'seconds': round(elapsed, 3),
+        'generator': generated,
+        'stages': {stage.name: stage.report() for stage in stages},
+        'database': totals,
+        'expected_balance': expected,
+        'storage_calls': dict(s3.calls),
+        'failures': failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local end-to-end run of the ACH pipeline')
+    parser.add_argument('--rate', type=float, default=20, help='files generated per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of generation')
+    parser.add_argument('--workers', type=int, default=4, help='workers of each stage')
+    parser.add_argument('--batch-size', type=int, default=10, help='records per event')
+    parser.add_argument('--generator-workers', type=int, default=4)
+    parser.add_argument('--entries-min', type=int, default=300)
+    parser.add_argument('--entries-max', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=corpus.SEED)
+    parser.add_argument('--output', help='report file, stdout by default')
+    parser.add_argument('--verbose', action='store_true', help='log the services')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    report = run(args.rate, args.duration, workers=args.workers, batch_size=args.batch_size,
+                 generator_workers=args.generator_workers, entries_min=args.entries_min,
+                 entries_max=args.entries_max, seed=args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for failure in report['failures']:
+        print('FAILURE ' + failure, file=sys.stderr)
+    return 1 if report['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
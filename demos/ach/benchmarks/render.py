@@ -0,0 +1,108 @@
+import math
+import os
+import random
+import sys
+import time
+
+# ach/ is shared by the containers, see demos/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'common'))
+
+from ach.builder import AchFile
+
+"""
+Rendering benchmark of AchFile
+
+Compares render_to_string with the previous rendering by string
+concatenation, on generated files of 10k, 100k and 1M entries by default:
+
+    python render.py [entries ...]
+"""
+
+SETTINGS = {
+    'immediate_dest': '06000001',
+    'immediate_org': '1234567890',
+    'immediate_dest_name': 'BANK ONE',
+    'immediate_org_name': 'ACME CORP',
+    'company_id': '1234567890',
+}
+
+
+def build_file(entries, batch_size=10000):
+    random.seed(entries)
+    ach_file = AchFile('A', SETTINGS)
+
+    for start in range(0, entries, batch_size):
+        ach_file.add_batch('POS', [{
+            'type': '27',
+            'routing_number': '0600000' + str(random.randint(1, 7)),
+            'account_number': str(random.randint(111111111, 999999999)),
+            'amount': str(random.randint(100, 200000) / 100),
+            'name': 'JOHN DOE',
+        } for _ in range(min(batch_size, entries - start))],
+            credits=True, debits=True)
+
+    return ach_file
+
+
+def concatenated_entry(entry, line_ending):
+    ret_string = entry.entry_detail.get_row() + line_ending
+    for addenda in entry.addenda_record:
+        ret_string += addenda.get_row() + line_ending
+    return ret_string
+
+
+def concatenated_batch(batch, line_ending):
+    ret_string = batch.batch_header.get_row() + line_ending
+    for entry in batch.entries:
+        ret_string += concatenated_entry(entry, line_ending)
+    ret_string += batch.batch_control.get_row() + line_ending
+    return ret_string
+
+
+def concatenated_file(ach_file, force_crlf=False):
+    """
+    Previous render_to_string, one string concatenation per line
+    """
+    line_ending = "\r\n" if force_crlf else "\n"
+
+    ret_string = ach_file.header.get_row() + line_ending
+    for batch in ach_file.batches:
+        ret_string += concatenated_batch(batch, line_ending)
+    ret_string += ach_file.control.get_row() + line_ending
+
+    lines = ach_file.get_lines(ach_file.batches)
+    nine_lines = int(round(10 * (math.ceil(lines / 10.0) - (lines / 10.0))))
+    nines = ''
+    for i in range(nine_lines):
+        nines += '9' * 94
+        if i == nine_lines - 1:
+            continue
+        nines += line_ending
+
+    return ret_string + nines
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    for entries in sizes:
+        ach_file, build_time = timed(build_file, entries)
+        print('{} entries, built in {:.2f}s'.format(entries, build_time))
+
+        for force_crlf in (False, True):
+            expected, concatenated_time = timed(concatenated_file, ach_file, force_crlf)
+            rendered, render_time = timed(ach_file.render_to_string, force_crlf)
+            if rendered != expected:
+                raise Exception('rendered files differ')
+            print('  {}: concatenation {:.3f}s, render_to_string {:.3f}s ({:.1f}x)'.format(
+                'CRLF' if force_crlf else 'LF', concatenated_time, render_time,
+                concatenated_time / render_time))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
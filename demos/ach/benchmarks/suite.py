@@ -0,0 +1,243 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+
+import corpus
+
+sys.path.append(os.path.join(corpus.CONTAINERS, 'RDFI processor'))
+
+import aggregation
+from ach.builder import AchFile
+from ach.parser import ColumnarParser, Parser, StreamParser
+from ach.writer import AchWriter
+from partitioner import load_routing_table, partition, write_partitions
+
+"""
+Benchmark suite of the ACH pipeline
+
+Times the builder, the parsers and the work of the RDFI splitter and
+processor on the seeded corpora of corpus.py, and writes the results as
+JSON. create_ach_files and compute_amount are timed without their object
+storage calls, on the functions they wrap.
+
+    python suite.py [--sizes 1000,100000,1000000] [--output results.json]
+                    [--thresholds thresholds.json] [--baseline previous.json]
+
+The run fails (exit status 1) when a case is slower than the minimum rate
+of thresholds.json, or more than --max-regression slower than the same
+case in a baseline results file.
+"""
+
+CASES = ['add_batch', 'render_to_string', 'parser', 'stream_parser',
+         'columnar_parser', 'create_ach_files', 'compute_amount']
+
+# Entries per add_batch call of the add_batch case
+BATCH_SIZE = 10000
+
+
+def entry_records(data, routing_table):
+    # Entries in the format of add_batch, as produced by the splitter
+    header, partitions = partition(StreamParser(io.BytesIO(data)).lines(), routing_table)
+    return [record for entries in partitions.values() for record in entries]
+
+
+def run_add_batch(context):
+    records = context['records']
+    start = time.perf_counter()
+    ach_file = AchFile('A', corpus.SETTINGS)
+    for offset in range(0, len(records), BATCH_SIZE):
+        ach_file.add_batch('POS', records[offset:offset + BATCH_SIZE],
+                           credits=True, debits=True)
+    elapsed = time.perf_counter() - start
+    context['ach_file'] = ach_file
+    return elapsed
+
+
+def run_render_to_string(context):
+    start = time.perf_counter()
+    context['ach_file'].render_to_string()
+    return time.perf_counter() - start
+
+
+def run_parser(context):
+    text = context['data'].decode('ascii')
+    start = time.perf_counter()
+    Parser(text)
+    return time.perf_counter() - start
+
+
+def run_stream_parser(context):
+    start = time.perf_counter()
+    for record in StreamParser(io.BytesIO(context['data'])):
+        pass
+    return time.perf_counter() - start
+
+
+def run_columnar_parser(context):
+    start = time.perf_counter()
+    ColumnarParser(context['data']).entries()
+    return time.perf_counter() - start
+
+
+class DiscardSink(object):
+    """Sink of the split files, their content is not kept"""
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+def run_create_ach_files(context):
+    start = time.perf_counter()
+    writers = write_partitions(StreamParser(io.BytesIO(context['data'])).lines(),
+                               context['routing_table'],
+                               lambda routing_number, settings: AchWriter(DiscardSink(), 'A', settings))
+    for writer in writers.values():
+        writer.close()
+    return time.perf_counter() - start
+
+
+def run_compute_amount(context):
+    start = time.perf_counter()
+    Decimal(aggregation.aggregate(io.BytesIO(context['data']))['net']) / 100
+    return time.perf_counter() - start
+
+
+RUNNERS = {case: globals()['run_' + case] for case in CASES}
+
+
+def run(sizes, variants, cases, corpus_dir, repeat=3, seed=corpus.SEED):
+    """
+    Returns the results of the cases on each corpus, the best of repeat
+    runs is kept (a single run from 1M entries)
+    """
+    routing_table = load_routing_table(corpus.ROUTING_TABLE)
+    results = []
+
+    for entries in sizes:
+        for variant in variants:
+            path = corpus.load_corpus(corpus_dir, entries, variant, seed)
+            with open(path, 'rb') as f:
+                data = f.read()
+            context = {'data': data, 'routing_table': routing_table}
+            if 'add_batch' in cases or 'render_to_string' in cases:
+                context['records'] = entry_records(data, routing_table)
+
+            for case in CASES:
+                if case not in cases:
+                    continue
+                if case == 'render_to_string' and 'ach_file' not in context:
+                    run_add_batch(context)
+                times = [RUNNERS[case](context)
+                         for _ in range(repeat if entries < 1000000 else 1)]
+                results.append({
+                    'case': case,
+                    'corpus': corpus.corpus_name(entries, variant, seed),
+                    'sha256': corpus.digest(path),
+                    'entries': entries,
+                    'bytes': len(data),
+                    'seconds': min(times),
+                    'median_seconds': statistics.median(times),
+                    'runs': len(times),
+                    'entries_per_second': round(entries / min(times)),
+                })
+                print('{:<18} {:<28} {:>9.3f}s {:>12,} entries/s'.format(
+                    case, results[-1]['corpus'], min(times),
+                    results[-1]['entries_per_second']), file=sys.stderr)
+
+    return {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': results,
+    }
+
+
+def check(report, thresholds=None, baseline=None, max_regression=0.25):
+    """
+    Returns the list of regressions of a report
+    """
+    failures = []
+    previous = {}
+    if baseline:
+        previous = {(result['case'], result['corpus']): result
+                    for result in baseline['results']}
+
+    for result in report['results']:
+        rate = result['entries_per_second']
+        minimum = (thresholds or {}).get(result['case'])
+        if minimum is not None and rate < minimum:
+            failures.append('{case} on {corpus}: {rate} entries/s, minimum {minimum}'.format(
+                rate=rate, minimum=minimum, **result))
+
+        before = previous.get((result['case'], result['corpus']))
+        if before and result['seconds'] > before['seconds'] * (1 + max_regression):
+            failures.append('{case} on {corpus}: {seconds:.3f}s, baseline {before:.3f}s'.format(
+                before=before['seconds'], **result))
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ACH pipeline benchmarks')
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--variants', default=','.join(corpus.VARIANTS))
+    parser.add_argument('--cases', default=','.join(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=corpus.SEED)
+    parser.add_argument('--corpus-dir', default=os.path.join(corpus.HERE, 'corpus'))
+    parser.add_argument('--output', help='results file, stdout by default')
+    parser.add_argument('--thresholds', default=os.path.join(corpus.HERE, 'thresholds.json'))
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(',')
+    for case in cases:
+        if case not in RUNNERS:
+            parser.error('unknown case {}'.format(case))
+
+    report = run([int(size) for size in args.sizes.split(',')], args.variants.split(','),
+                 cases, args.corpus_dir, repeat=args.repeat, seed=args.seed)
+
+    thresholds = None
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)['min_entries_per_second']
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report['failures'] = check(report, thresholds, baseline, args.max_regression)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for failure in report['failures']:
+        print('REGRESSION ' + failure, file=sys.stderr)
+    return 1 if report['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
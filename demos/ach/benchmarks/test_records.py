@@ -0,0 +1,40 @@
+import pytest
+
+import corpus  # Adds the modules of the services to sys.path
+
+from ach.data_types import AchError, EntryDetail
+
+"""
+Validation of the ACH records built in one load() call
+
+    python -m pytest test_records.py
+"""
+
+ENTRY = {
+    'transaction_code': '27',
+    'recv_dfi_id': '06000001',
+    'dfi_acnt_num': '123456789',
+    'amount': 1000,
+    'ind_name': 'JOHN DOE',
+    'trace_num': '060000010000001',
+}
+
+
+@pytest.mark.parametrize('field', ['transaction_code', 'recv_dfi_id',
+                                   'dfi_acnt_num', 'amount', 'ind_name',
+                                   'trace_num'])
+def test_empty_required_field_raises(field):
+    with pytest.raises(AchError):
+        EntryDetail('PPD', **dict(ENTRY, **{field: ''}))
+
+
+def test_empty_optional_fields_are_padded():
+    entry = EntryDetail('PPD', **ENTRY)
+    assert len(entry.get_row()) == 94
+    assert entry.id_number == ' ' * 15
+    assert entry.add_rec_ind == '0'
+
+
+def test_ind_name_not_required_without_it_in_the_row():
+    fields = dict(ENTRY, ind_name='')
+    assert len(EntryDetail('CTX', **fields).get_row()) == 94
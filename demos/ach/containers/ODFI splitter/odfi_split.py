@@ -1,39 +1,65 @@
-import http.server
 import io
-import json
 import logging
 import os
 import random
-import socketserver
 import sys
+import time
 from io import BytesIO
 
-import boto3
-import mysql.connector
-from cloudevents.sdk import marshaller
-from cloudevents.sdk.event import v02
-
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
-
-db_user = os.environ['database-user']
-db_password = os.environ['database-password']
-db_host = os.environ['database-host']
-db_db = os.environ['database-db']
+import consumer
+import helper_db
+import notifications
+import serving
+import storage
+
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point')
+
+# Serving mode, see serving.py
+serving_mode = os.environ.get('serving_mode', 'thread')
+serving_workers = int(os.environ.get('serving_workers', '4'))
+
+# Number of records of a notification processed concurrently
+record_concurrency = int(os.environ.get('record_concurrency', '4'))
+
+# Event source: 'http' to receive the KafkaSource events, 'kafka' to consume
+# the topic directly, see consumer.py
+event_source = os.environ.get('event_source', 'http')
+kafka_bootstrap_servers = os.environ.get('kafka_bootstrap_servers', 'my-cluster-kafka-bootstrap.kafka:9092')
+kafka_topic = os.environ.get('kafka_topic', 'merchant-upload')
+kafka_group_id = os.environ.get('kafka_group_id', 'odfi-split')
+kafka_max_poll_records = int(os.environ.get('kafka_max_poll_records', '100'))
+kafka_max_in_flight = int(os.environ.get('kafka_max_in_flight', '2'))
+# Records still failing after kafka_max_attempts go to the dead-letter topic,
+# they are only logged when it is empty
+kafka_max_attempts = int(os.environ.get('kafka_max_attempts', '3'))
+kafka_dead_letter_topic = os.environ.get('kafka_dead_letter_topic', '')
+
+# Split mode: 'copy' reads only the file header and copies the object server
+# side, 'download' loads the whole file and uploads it again
+split_mode = os.environ.get('split_mode', 'copy')
+# Objects larger than this are copied in parts
+copy_multipart_threshold = int(os.environ.get('copy_multipart_threshold_mb', '8')) * 1024 * 1024
+
+db_user = os.environ.get('database-user')
+db_password = os.environ.get('database-password')
+db_host = os.environ.get('database-host')
+db_db = os.environ.get('database-db')
+helper_db.configure(db_user, db_password, db_host, db_db,
+                    pool_size=int(os.environ.get('database-pool-size', '5')))
+
+# Counters are written to the helper database in the background
+metrics_writer = helper_db.MetricsWriter(
+    flush_rows=int(os.environ.get('metrics-flush-rows', '100')),
+    flush_interval_ms=int(os.environ.get('metrics-flush-interval-ms', '1000')))
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-s3client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
-                        aws_access_key_id=access_key,
-                        aws_secret_access_key=secret_key,
-                        use_ssl=True if 'https' in service_point else False)
-
-m = marshaller.NewDefaultHTTPMarshaller()
-
+storage.configure(service_point, access_key, secret_key)
 
-class ForkedHTTPServer(socketserver.ForkingMixIn, http.server.HTTPServer):
-    """Handle requests with fork."""
+# Transfer settings of the managed copy, created on first use
+copy_config = None
 
 
 class CloudeventsServer(object):
@@ -42,52 +68,54 @@ class CloudeventsServer(object):
     of how to pass the event data.
     """
 
-    def __init__(self, port=8080):
+    def __init__(self, port=8080, mode='thread', workers=4, on_shutdown=None,
+                 readiness=None):
         self.port = port
+        self.mode = mode
+        self.workers = workers
+        self.on_shutdown = on_shutdown
+        self.readiness = readiness
 
     def start_receiver(self, func):
         """Start listening to HTTP requests
         :param func: the callback to call upon a cloudevents request
         :type func: cloudevent -> none
         """
-        class BaseHttp(http.server.BaseHTTPRequestHandler):
+        class BaseHttp(serving.ProbeHandler):
             def do_POST(self):
                 logging.info('POST received')
-                content_type = self.headers.get('Content-Type')
-                logging.info(content_type)
                 content_len = int(self.headers.get('Content-Length'))
-                logging.info(content_len)
-                headers = dict(self.headers)
-                logging.info(headers)
                 data = self.rfile.read(content_len)
-                data = data.decode('utf-8')
-                logging.info(data)
-
-                #if content_type != 'application/json':
-                #    logging.info('Not JSON')
-                #    data = io.StringIO(data)
-
-                #try:
-                #    event = v02.Event()
-                #    event = m.FromRequest(event, headers, data, json.loads)
-                #except Exception as e:
-                #    logging.error(f"Event error: {e}")
-                #    raise
-                event = eval(data)['Records'][0]
-                logging.info(event)
-                func(event)
+
+                start = time.perf_counter()
+                try:
+                    records = notifications.decode(data)
+                except notifications.NotificationError as e:
+                    logging.error(f"Event error: {e}")
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                logging.info('{} record(s) decoded from {} bytes in {:.3f}ms'.format(
+                    len(records), content_len, (time.perf_counter() - start) * 1000))
+
+                report = func(records)
+                if report['failed']:
+                    # Report the records that failed, the others were processed
+                    self.send_json(500, report)
+                    return
                 self.send_response(204)
                 self.end_headers()
                 return
 
-        socketserver.TCPServer.allow_reuse_address = True
-        with ForkedHTTPServer(("", self.port), BaseHttp) as httpd:
-            try:
-                logging.info("serving at port {}".format(self.port))
-                httpd.serve_forever()
-            except:
-                httpd.server_close()
-                raise
+            def do_GET(self):
+                # Counters of the metrics writer, or the probes
+                if self.path != '/metrics':
+                    return super().do_GET()
+                self.send_json(200, metrics_writer.metrics)
+
+        serving.serve(self.port, BaseHttp, mode=self.mode,
+                      workers=self.workers, on_shutdown=self.on_shutdown,
+                      readiness=self.readiness)
 
 
 def extract_data(msg):
@@ -102,12 +130,34 @@ def extract_data(msg):
 
 def load_file(bucket_name, object_key):
     logging.info('load_file')
-    obj = s3client.get_object(Bucket=bucket_name, Key=object_key)
+    obj = storage.get_client().get_object(Bucket=bucket_name, Key=object_key)
     content = obj['Body'].read().decode('utf-8')
     return content
 
+def load_header(bucket_name, object_key):
+    # The File Header is the first 94 characters record of an ACH file
+    logging.info('load_header')
+    obj = storage.get_client().get_object(Bucket=bucket_name, Key=object_key, Range='bytes=0-93')
+    header = obj['Body'].read().decode('utf-8')
+    return header
+
+def get_copy_config():
+    # boto3 is only imported with the object storage client
+    global copy_config
+    if copy_config is None:
+        from boto3.s3.transfer import TransferConfig
+        copy_config = TransferConfig(multipart_threshold=copy_multipart_threshold,
+                                     multipart_chunksize=copy_multipart_threshold)
+    return copy_config
+
+def copy_file(source_bucket, object_key, bucket_name):
+    # Managed copy, done by the storage with CopyObject or UploadPartCopy
+    logging.info('copy_file')
+    storage.get_client().copy({'Bucket': source_bucket, 'Key': object_key},
+                  bucket_name, object_key, Config=get_copy_config())
+
 def save_file(bucket_name, file_name, content):
-    sent_data = s3client.put_object(
+    sent_data = storage.get_client().put_object(
         Bucket=bucket_name, Key=file_name, Body=content)
     if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
         raise logging.error(
@@ -115,50 +165,89 @@ def save_file(bucket_name, file_name, content):
 
 def delete_file(bucket_name, object_key):
     logging.info('delete_file')
-    s3client.delete_object(Bucket=bucket_name,Key=object_key)
+    storage.get_client().delete_object(Bucket=bucket_name,Key=object_key)
 
 
 def get_odfi_routing(content):
     odfi_routing = content.splitlines()[0][4:12]
     return odfi_routing
 
-def update_odfi_split():
+def update_odfi_split(entries=1):
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO odfi_split(time,entry) SELECT CURRENT_TIMESTAMP(), 1;'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        metrics_writer.record('odfi_split', entry=entries)
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
 
-def run_event(event):
+def process_record(record):
     try:
-        extracted_data = extract_data(event)
+        extracted_data = extract_data(record)
         bucket_eventName = extracted_data['bucket_eventName']
         bucket_name = extracted_data['bucket_name']
         object_key = extracted_data['object_key']
         logging.info(bucket_eventName + ' ' + bucket_name + ' ' + object_key)
 
-        if bucket_eventName == 's3:ObjectCreated:Put':
-            # Load file and treat it
-            content = load_file(bucket_name, object_key)
-            odfi_routing = get_odfi_routing(content)
-            save_file('ach-odfi-' + odfi_routing,object_key,content)
-            update_odfi_split()
+        if bucket_eventName.startswith('s3:ObjectCreated:'):
+            if split_mode == 'download':
+                # Load file and treat it
+                content = load_file(bucket_name, object_key)
+                odfi_routing = get_odfi_routing(content)
+                save_file('ach-odfi-' + odfi_routing,object_key,content)
+            else:
+                # Only the header goes through the pod
+                header = load_header(bucket_name, object_key)
+                odfi_routing = get_odfi_routing(header)
+                copy_file(bucket_name, object_key, 'ach-odfi-' + odfi_routing)
             delete_file(bucket_name, object_key)
+            return True
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
 
-client = CloudeventsServer()
-client.start_receiver(run_event)
+def run_event(records):
+    report = notifications.process_batch(records, process_record, record_concurrency)
+    processed = sum(1 for result in report['processed'].values() if result)
+    if processed:
+        update_odfi_split(processed)  # One counter row for the whole batch
+    return report
+
+
+def create_readiness():
+    # Clients created before the service is ready, instead of at import
+    return serving.Readiness([
+        ('storage', storage.get_client),
+        ('transfer', get_copy_config),
+        ('database', helper_db.get_pool),
+        ('metrics', metrics_writer.start),
+    ])
+
+
+def create_app():
+    """
+    Returns the receiver of the service, warmed up when it starts serving
+    """
+    return CloudeventsServer(mode=serving_mode, workers=serving_workers,
+                             on_shutdown=[metrics_writer.close],
+                             readiness=create_readiness())
+
+
+def main():
+    if event_source == 'kafka':
+        create_readiness().warm()
+        consumer.consume(run_event, kafka_topic, kafka_bootstrap_servers, kafka_group_id,
+                         decode=notifications.decode,
+                         max_poll_records=kafka_max_poll_records,
+                         max_in_flight=kafka_max_in_flight,
+                         max_attempts=kafka_max_attempts,
+                         dead_letter_topic=kafka_dead_letter_topic,
+                         on_shutdown=[metrics_writer.close])
+    else:
+        create_app().start_receiver(run_event)
+
+
+if __name__ == '__main__':
+    main()
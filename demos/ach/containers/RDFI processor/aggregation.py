@@ -0,0 +1,165 @@
+import numpy as np
+
+from ach.parser import ColumnarParser, Parser
+
+"""
+Aggregation of the entry amounts of an ACH file
+
+The file is read in blocks of complete records, each block is loaded as a
+NumPy array and the transaction code and amount columns are converted and
+summed in one pass, as int64 cents. Totals are split between debits and
+credits, and checked against the Batch Control and File Control totals.
+"""
+
+DEBIT_CODES = [27, 37, 28, 38]
+CREDIT_CODES = [22, 32, 23, 33]
+
+
+class ControlMismatch(Exception):
+    pass
+
+
+def to_int(column):
+    digits = column.astype(np.int64) - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        raise ValueError('amount field is not numeric')
+    weights = 10 ** np.arange(column.shape[1] - 1, -1, -1, dtype=np.int64)
+    return digits @ weights
+
+
+def field_slice(definitions, name):
+    for rule in definitions:
+        if rule['field'].strip() == name:
+            return slice(rule['pos'], rule['pos'] + rule['len'])
+    raise KeyError(name)
+
+
+class AmountAggregator(object):
+    '''
+    Sums the amounts of the entries fed block by block with feed(), the
+    totals are returned by finish()
+    '''
+
+    TRANSACTION_CODE = field_slice(Parser.ENTRY_DETAIL_DEF, 'transaction_code')
+    AMOUNT = field_slice(Parser.ENTRY_DETAIL_DEF, 'amount')
+    BATCH_DEBIT = field_slice(Parser.BATCH_CONTROL_DEF, 'debit_amount')
+    BATCH_CREDIT = field_slice(Parser.BATCH_CONTROL_DEF, 'credit_amount')
+    FILE_DEBIT = field_slice(Parser.FILE_CONTROL_DEF, 'debit_amount')
+    FILE_CREDIT = field_slice(Parser.FILE_CONTROL_DEF, 'credit_amount')
+
+    def __init__(self):
+        self.remainder = b''
+        self.entries = 0
+        self.debit = 0
+        self.credit = 0
+        self.other = 0
+        self.batches = 0
+        # Debit and credit totals of the batches whose control is not read yet
+        self.open_batches = {}
+        self.file_control = None
+        self.mismatches = []
+
+    def feed(self, data):
+        data = self.remainder + data
+        end = data.rfind(b'\n') + 1
+        self.remainder = data[end:]
+        if end:
+            self.aggregate(data[:end])
+
+    def finish(self):
+        '''
+        Returns the totals in cents, net is the debits minus the credits
+        '''
+        if self.remainder.strip():
+            self.aggregate(self.remainder)
+        self.remainder = b''
+
+        for batch in sorted(self.open_batches):
+            self.mismatches.append('batch {} has no control record'.format(batch))
+        self.open_batches = {}
+
+        if self.file_control is None:
+            self.mismatches.append('file has no control record')
+        elif self.file_control != (self.debit, self.credit):
+            self.mismatches.append('file control {} != entries {}'.format(
+                self.file_control, (self.debit, self.credit)))
+
+        return {
+            'entries': self.entries,
+            'batches': self.batches,
+            'debit': self.debit,
+            'credit': self.credit,
+            'other': self.other,
+            'net': self.debit - self.credit,
+            'mismatches': self.mismatches,
+        }
+
+    def aggregate(self, block):
+        records = ColumnarParser.to_records(block)
+        record_types = records[:, 0]
+        is_entry = record_types == ord(Parser.ENTRY_DETAIL)
+        is_control = record_types == ord(Parser.BATCH_CONTROL)
+
+        # Each entry belongs to the batch of the next Batch Control
+        batch_seq = np.cumsum(is_control) - is_control + self.batches
+
+        entries = records[is_entry]
+        if len(entries):
+            codes = to_int(entries[:, self.TRANSACTION_CODE])
+            amounts = to_int(entries[:, self.AMOUNT])
+            is_debit = np.isin(codes, DEBIT_CODES)
+            is_credit = np.isin(codes, CREDIT_CODES)
+            debits = np.where(is_debit, amounts, 0)
+            credits = np.where(is_credit, amounts, 0)
+
+            self.entries += len(amounts)
+            self.debit += int(debits.sum())
+            self.credit += int(credits.sum())
+            self.other += int(amounts[~(is_debit | is_credit)].sum())
+
+            # Entries are in file order, each batch is a contiguous run
+            seq = batch_seq[is_entry]
+            starts = np.flatnonzero(np.r_[True, seq[1:] != seq[:-1]])
+            for batch, debit, credit in zip(seq[starts],
+                                            np.add.reduceat(debits, starts),
+                                            np.add.reduceat(credits, starts)):
+                totals = self.open_batches.setdefault(int(batch), [0, 0])
+                totals[0] += int(debit)
+                totals[1] += int(credit)
+
+        controls = records[is_control]
+        if len(controls):
+            control_totals = zip(to_int(controls[:, self.BATCH_DEBIT]),
+                                 to_int(controls[:, self.BATCH_CREDIT]))
+            for debit, credit in control_totals:
+                totals = tuple(self.open_batches.pop(self.batches, (0, 0)))
+                if totals != (debit, credit):
+                    self.mismatches.append('batch {} control {} != entries {}'.format(
+                        self.batches, (int(debit), int(credit)), totals))
+                self.batches += 1
+
+        if self.file_control is None:
+            # Blocking filler records are all 9s as well, the control is the first one
+            is_file_control = record_types == ord(Parser.FILE_CONTROL)
+            if is_file_control.any():
+                control = records[is_file_control][:1]
+                self.file_control = (int(to_int(control[:, self.FILE_DEBIT])[0]),
+                                     int(to_int(control[:, self.FILE_CREDIT])[0]))
+
+
+def aggregate(stream, chunk_size=4 * 1024 * 1024, strict=True):
+    '''
+    Returns the totals of the entries of an ACH file read from a byte stream
+    :param strict: raise ControlMismatch when a control total is wrong
+    '''
+    aggregator = AmountAggregator()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        aggregator.feed(chunk)
+    totals = aggregator.finish()
+
+    if strict and totals['mismatches']:
+        raise ControlMismatch('; '.join(totals['mismatches']))
+    return totals
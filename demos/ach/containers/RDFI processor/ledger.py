@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import helper_db
+
+"""
+Running balance of the bank
+
+The current balance is kept in the single row of balance_ledger and changed
+with an atomic increment, under the row lock of the UPDATE, instead of
+scanning bank_balance for its MAX(). The new balance is then appended to
+bank_balance in the same transaction, so the history read by the dashboard
+is unchanged. Both statements cost the same whatever the size of the
+history.
+
+Each delta is the amount of a file, keyed on its object name. The name is
+inserted in balance_files in the same transaction, and the delta of a name
+already there is not applied again: a file delivered again after its
+amount was recorded does not change the balance.
+
+The deltas applied concurrently by the threads of a process are grouped:
+while a transaction is running, the next deltas wait and are written
+together in the following one, by the first of their callers. Each caller
+writes one transaction at most, then hands over to the next one waiting.
+"""
+
+INSERT_FILE = 'INSERT IGNORE INTO balance_files(name) VALUES (%s)'
+UPDATE_LEDGER = 'UPDATE balance_ledger SET balance = balance + %s WHERE id = 1'
+SELECT_LEDGER = 'SELECT balance FROM balance_ledger WHERE id = 1'
+INSERT_HISTORY = 'INSERT INTO bank_balance(time,balance) VALUES (CURRENT_TIMESTAMP(), %s)'
+
+
+def read_balance(cursor):
+    cursor.execute(SELECT_LEDGER)
+    row = cursor.fetchone()
+    if row is None:
+        raise Exception('balance_ledger is not initialized')
+    return row[0]
+
+
+def write(deltas):
+    """
+    Adds the deltas, by file name, of the files not applied yet to the
+    balance in one transaction. Returns the new balance and the names of
+    the files applied.
+    """
+    def statements(cursor):
+        applied = []
+        for name, delta in deltas.items():
+            cursor.execute(INSERT_FILE, (name,))
+            # Ignored when the file was already applied
+            if cursor.rowcount == 1:
+                applied.append(name)
+        if not applied:
+            return read_balance(cursor), applied
+
+        # rowcount is not checked, a zero delta changes no row
+        cursor.execute(UPDATE_LEDGER, (sum(deltas[name] for name in applied),))
+        # The row stays locked by the UPDATE until the commit
+        balance = read_balance(cursor)
+        cursor.execute(INSERT_HISTORY, (balance,))
+        return balance, applied
+
+    # Not retried, the transaction could have been committed before the error
+    return helper_db.run(statements, retries=0)
+
+
+class BalanceLedger(object):
+    """
+    Applies balance deltas, grouping the concurrent ones in one transaction
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.writing = False
+        self.metrics = {'deltas': 0, 'transactions': 0}
+
+    def apply(self, deltas):
+        """
+        Adds the deltas, by file name, to the balance. Returns the new
+        balance and the names of the files applied by this call, once written.
+        """
+        future = Future()
+        # Set when the deltas were written, or when it is this caller's turn
+        # to write them
+        turn = threading.Event()
+        future.add_done_callback(lambda future: turn.set())
+        with self.lock:
+            self.pending.append((deltas, future, turn))
+            if not self.writing:
+                self.writing = True
+                turn.set()
+
+        turn.wait()
+        if not future.done():
+            # Writes its deltas and those queued meanwhile
+            self.write_pending()
+
+        return future.result()
+
+    def write_pending(self):
+        """
+        Writes the queued deltas in one transaction, then hands over to the
+        first caller queued meanwhile
+        """
+        with self.lock:
+            batch, self.pending = self.pending, []
+
+        # A file in several calls is applied for the first one only
+        merged = {}
+        owned = []
+        for deltas, future, turn in batch:
+            names = [name for name in deltas if name not in merged]
+            merged.update((name, deltas[name]) for name in names)
+            owned.append(names)
+
+        start = time.perf_counter()
+        try:
+            balance, applied = write(merged)
+        except Exception as e:
+            for deltas, future, turn in batch:
+                future.set_exception(e)
+        else:
+            self.metrics['deltas'] += len(batch)
+            self.metrics['transactions'] += 1
+            logging.info('{} balance delta(s) applied in {:.3f}s'.format(
+                len(batch), time.perf_counter() - start))
+            applied = set(applied)
+            for (deltas, future, turn), names in zip(batch, owned):
+                future.set_result((balance, [name for name in names if name in applied]))
+
+        with self.lock:
+            if self.pending:
+                self.pending[0][2].set()
+            else:
+                self.writing = False
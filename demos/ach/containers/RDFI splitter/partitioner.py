@@ -0,0 +1,121 @@
+import csv
+import logging
+
+"""
+One pass partitioning of an ACH file by receiving bank (RDFI)
+"""
+
+
+def load_routing_table(path):
+    """
+    Reads the receiving banks from a CSV file of
+    (routing without check_digit, name) rows
+    """
+    routing_table = {}
+
+    with open(path, newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            if row and not row[0].startswith('#'):
+                routing_table[row[0].strip()] = row[1].strip()
+
+    return routing_table
+
+
+def create_setting_entry(header):
+    immediate_dest = header[4:12]  # ODFI Bank routing number
+    immediate_org = header[13:23]  # Company's ACH id
+    immediate_dest_name = header[40:63]  # Bank's name
+    immediate_org_name = header[63:86]  # Company's name
+    # Company's ACH id (again, comes from original generator)
+    company_id = header[13:23]
+
+    settings = {
+        'immediate_dest': immediate_dest,
+        'immediate_org': immediate_org,
+        'immediate_dest_name': immediate_dest_name,
+        'immediate_org_name': immediate_org_name,
+        'company_id': company_id,  # tax number
+    }
+
+    return settings
+
+
+def entry_record(line, routing_number):
+    # Entry of the RDFI file, in the format of AchFile.add_batch
+    return {
+        'type'           : '27',  #  We're creating debits only
+        'routing_number' : routing_number,
+        'account_number' : line[12:29],  # Customer account number
+        'amount'         : str(float(line[29:39])/100),  # Amount
+        'name'           : line[54:76]  # Customer name
+    }
+
+
+def partition(lines, routing_table):
+    """
+    Scans the records once and groups the entries by destination (RDFI).
+    Returns the file header and a dict of entries per routing number.
+    Entries for banks that are not in the routing table are dropped.
+    """
+    header = None
+    partitions = {}
+    unrouted = 0
+
+    for line in lines:
+        if line[0] == '1':
+            header = line
+        elif line[0] == '6':  # Transaction
+            routing_number = line[3:11]  # RDFI bank (customer's bank)
+            if routing_number not in routing_table:
+                unrouted += 1
+                continue
+            partition = partitions.get(routing_number)
+            if partition is None:
+                partition = partitions[routing_number] = []
+            partition.append(entry_record(line, routing_number))
+
+    if unrouted:
+        logging.info('{} entries without a known RDFI'.format(unrouted))
+
+    return header, partitions
+
+
+def write_partitions(lines, routing_table, open_writer, max_writers=None):
+    """
+    Scans the records once and writes each entry to the file of its
+    destination (RDFI) as it is read, nothing but the writers is kept.
+    open_writer(routing_number, settings) returns the AchWriter of a
+    routing number, it is called on its first entry. Returns the writers by
+    routing number, to be closed by the caller. They are all aborted if the
+    scan fails, or if the file has entries for more than max_writers RDFIs.
+    Entries for banks that are not in the routing table are dropped.
+    """
+    settings = None
+    writers = {}
+    unrouted = 0
+
+    try:
+        for line in lines:
+            if line[0] == '1':
+                settings = create_setting_entry(line)
+            elif line[0] == '6':  # Transaction
+                routing_number = line[3:11]  # RDFI bank (customer's bank)
+                if routing_number not in routing_table:
+                    unrouted += 1
+                    continue
+                writer = writers.get(routing_number)
+                if writer is None:
+                    if max_writers is not None and len(writers) >= max_writers:
+                        raise Exception('Entries for more than {} RDFIs'.format(max_writers))
+                    writer = writers[routing_number] = open_writer(routing_number, settings)
+                    writer.start_batch('POS', credits=True, debits=True)
+                writer.add_entry(entry_record(line, routing_number))
+    except Exception:
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    if unrouted:
+        logging.info('{} entries without a known RDFI'.format(unrouted))
+
+    return writers
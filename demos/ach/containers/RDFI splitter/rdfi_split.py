@@ -1,53 +1,80 @@
-import http.server
 import io
-import json
 import logging
 import os
 import random
-import socketserver
 import sys
-import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 
-import boto3
-
-import mysql.connector
-from ach.builder import AchFile
-from cloudevents.sdk import marshaller
-from cloudevents.sdk.event import v02
-
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
-
-db_user = os.environ['database-user']
-db_password = os.environ['database-password']
-db_host = os.environ['database-host']
-db_db = os.environ['database-db']
+import consumer
+import helper_db
+import notifications
+import serving
+import storage
+from ach.parser import StreamParser
+from ach.writer import AchWriter, S3MultipartSink
+from partitioner import load_routing_table, write_partitions
+
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point')
+
+# Serving mode, see serving.py
+serving_mode = os.environ.get('serving_mode', 'thread')
+serving_workers = int(os.environ.get('serving_workers', '4'))
+
+# Number of records of a notification processed concurrently
+record_concurrency = int(os.environ.get('record_concurrency', '4'))
+
+# Event source: 'http' to receive the KafkaSource events, 'kafka' to consume
+# the topic directly, see consumer.py
+event_source = os.environ.get('event_source', 'http')
+kafka_bootstrap_servers = os.environ.get('kafka_bootstrap_servers', 'my-cluster-kafka-bootstrap.kafka:9092')
+kafka_topic = os.environ.get('kafka_topic', 'odfi')
+kafka_group_id = os.environ.get('kafka_group_id', 'rdfi-split')
+kafka_max_poll_records = int(os.environ.get('kafka_max_poll_records', '100'))
+kafka_max_in_flight = int(os.environ.get('kafka_max_in_flight', '2'))
+# Records still failing after kafka_max_attempts go to the dead-letter topic,
+# they are only logged when it is empty
+kafka_max_attempts = int(os.environ.get('kafka_max_attempts', '3'))
+kafka_dead_letter_topic = os.environ.get('kafka_dead_letter_topic', '')
+
+db_user = os.environ.get('database-user')
+db_password = os.environ.get('database-password')
+db_host = os.environ.get('database-host')
+db_db = os.environ.get('database-db')
+helper_db.configure(db_user, db_password, db_host, db_db,
+                    pool_size=int(os.environ.get('database-pool-size', '5')))
+
+# Counters are written to the helper database in the background
+metrics_writer = helper_db.MetricsWriter(
+    flush_rows=int(os.environ.get('metrics-flush-rows', '100')),
+    flush_interval_ms=int(os.environ.get('metrics-flush-interval-ms', '1000')))
+
+# Parallel completion of the split files, and retries of each S3 request
+upload_concurrency = int(os.environ.get('upload_concurrency', '10'))
+upload_retries = int(os.environ.get('upload_retries', '3'))
+# Size of the multipart upload parts of the split files. Each open file
+# buffers up to one part, at most max_open_files per ACH file are open, so
+# up to record_concurrency * max_open_files * upload_part_size_mb MB are
+# buffered (4 * 16 * 8 MB by default). A file for more RDFIs fails.
+upload_part_size = int(os.environ.get('upload_part_size_mb', '8')) * 1024 * 1024
+max_open_files = int(os.environ.get('max_open_files', '16'))
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-s3client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
-                        aws_access_key_id=access_key,
-                        aws_secret_access_key=secret_key,
-                        use_ssl=True if 'https' in service_point else False)
-
-m = marshaller.NewDefaultHTTPMarshaller()
+# The split files are streamed, a failed part or upload is retried by the
+# client. botocore 1.12 (boto3 1.9) only accepts max_attempts, the number of
+# retries after the first request.
+storage.configure(service_point, access_key, secret_key,
+                  max_pool_connections=max(10, upload_concurrency),
+                  retries={'max_attempts': upload_retries})
 
-# banks format = (routing without check_digit, name)
-banks = [
-    ('06200001', 'BANK OF NEW-YORK'),
-    ('06200002', 'BANK OF CHICAGO'),
-    ('06200003', 'BANK OF BOSTON'),
-    ('06200004', 'BANK OF LOS ANGELES'),
-    ('06200005', 'BANK OF ORLANDO'),
-    ('06200006', 'BANK OF DENVER'),
-    ('06200007', 'BANK OF SEATTLE')
-]
-
-
-class ForkedHTTPServer(socketserver.ForkingMixIn, http.server.HTTPServer):
-    """Handle requests with fork."""
+# Receiving banks, routing (without check_digit) -> name, loaded on first use
+routing_table_path = os.environ.get(
+    'routing_table', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routing_table.csv'))
+routing_table = None
 
 
 class CloudeventsServer(object):
@@ -56,50 +83,62 @@ class CloudeventsServer(object):
     of how to pass the event data.
     """
 
-    def __init__(self, port=8080):
+    def __init__(self, port=8080, mode='thread', workers=4, on_shutdown=None,
+                 readiness=None):
         self.port = port
+        self.mode = mode
+        self.workers = workers
+        self.on_shutdown = on_shutdown
+        self.readiness = readiness
 
     def start_receiver(self, func):
         """Start listening to HTTP requests
         :param func: the callback to call upon a cloudevents request
         :type func: cloudevent -> none
         """
-        class BaseHttp(http.server.BaseHTTPRequestHandler):
+        class BaseHttp(serving.ProbeHandler):
             def do_POST(self):
                 logging.info('POST received')
-                content_type = self.headers.get('Content-Type')
                 content_len = int(self.headers.get('Content-Length'))
-                headers = dict(self.headers)
                 data = self.rfile.read(content_len)
-                data = data.decode('utf-8')
-                logging.info(content_type)
-                logging.info(data)
-
-                #if content_type != 'application/json':
-                #    logging.info('Not JSON')
-                #    data = io.StringIO(data)
-
-                #try:
-                #    event = v02.Event()
-                #    event = m.FromRequest(event, headers, data, json.loads)
-                #except Exception as e:
-                #    logging.error(f"Event error: {e}")
-                #    raise
-                event = eval(data)['Records'][0]
-                logging.info(event)
-                func(event)
+
+                start = time.perf_counter()
+                try:
+                    records = notifications.decode(data)
+                except notifications.NotificationError as e:
+                    logging.error(f"Event error: {e}")
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                logging.info('{} record(s) decoded from {} bytes in {:.3f}ms'.format(
+                    len(records), content_len, (time.perf_counter() - start) * 1000))
+
+                report = func(records)
+                if report['failed']:
+                    # Report the records that failed, the others were processed
+                    self.send_json(500, report)
+                    return
                 self.send_response(204)
                 self.end_headers()
                 return
 
-        socketserver.TCPServer.allow_reuse_address = True
-        with ForkedHTTPServer(("", self.port), BaseHttp) as httpd:
-            try:
-                logging.info("serving at port {}".format(self.port))
-                httpd.serve_forever()
-            except:
-                httpd.server_close()
-                raise
+            def do_GET(self):
+                # Counters of the metrics writer, or the probes
+                if self.path != '/metrics':
+                    return super().do_GET()
+                self.send_json(200, metrics_writer.metrics)
+
+        serving.serve(self.port, BaseHttp, mode=self.mode,
+                      workers=self.workers, on_shutdown=self.on_shutdown,
+                      readiness=self.readiness)
+
+
+def get_routing_table():
+    global routing_table
+    if routing_table is None:
+        routing_table = load_routing_table(routing_table_path)
+        logging.info('{} RDFIs in routing table'.format(len(routing_table)))
+    return routing_table
 
 
 def extract_data(msg):
@@ -112,105 +151,136 @@ def extract_data(msg):
     return data
 
 
-def load_file(bucket_name, file_key):
-    # logging.info('load_file')
-    obj = s3client.get_object(Bucket=bucket_name, Key=file_key)
-    content = obj['Body'].read().decode('utf-8')
-    return content
+def open_file(bucket_name, file_key):
+    # Returns the body as a stream, the file is never fully loaded in memory
+    obj = storage.get_client().get_object(Bucket=bucket_name, Key=file_key)
+    return obj['Body']
 
 
-def save_file(bucket_name, file_name, content):
-    sent_data = s3client.put_object(
-        Bucket=bucket_name, Key=file_name, Body=content)
-    if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
-        raise logging.error(
-            'Failed to upload file {} to bucket {}'.format(file_name, bucket_name))
+def close_file(writer):
+    # Writes the end of the file and completes its upload, the requests are
+    # retried by the client
+    sink = writer.sink
+    start = time.perf_counter()
+    try:
+        writer.close()
+    except Exception as e:
+        logging.error('Failed to upload file {} to bucket {} in {:.3f}s: {}'.format(
+            sink.key, sink.bucket, time.perf_counter() - start, e))
+        writer.abort()
+        raise
+    logging.info('Uploaded file {} to bucket {} in {:.3f}s'.format(
+        sink.key, sink.bucket, time.perf_counter() - start))
+
+
+def close_files(writers):
+    # Completes the uploads of the split files concurrently
+    if not writers:
+        return
+    start = time.perf_counter()
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(upload_concurrency, len(writers))) as executor:
+        futures = {executor.submit(close_file, writer): writer for writer in writers}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                failed.append(futures[future].sink.key)
+    logging.info('Uploaded {} files in {:.3f}s'.format(len(writers) - len(failed), time.perf_counter() - start))
+    if failed:
+        raise Exception('Failed to upload {} of {} files'.format(len(failed), len(writers)))
 
 def delete_file(bucket_name, object_key):
     logging.info('delete_file')
-    s3client.delete_object(Bucket=bucket_name,Key=object_key)
-
-
-def create_setting_entry(lines):
-    immediate_dest = lines[0][4:12]  # ODFI Bank routing number
-    immediate_org = lines[0][13:23]  # Company's ACH id
-    immediate_dest_name = lines[0][40:63]  # Bank's name
-    immediate_org_name = lines[0][63:86]  # Company's name
-    # Company's ACH id (again, comes from original generator)
-    company_id = lines[0][13:23]
-
-    settings = {
-        'immediate_dest': immediate_dest,
-        'immediate_org': immediate_org,
-        'immediate_dest_name': immediate_dest_name,
-        'immediate_org_name': immediate_org_name,
-        'company_id': company_id,  # tax number
-    }
-
-    return settings
-
-def create_ach_files(content):
-    lines = content.splitlines()
-    for i in range(0, len(banks)): # For each bank
-        ach_file = AchFile('A', create_setting_entry(lines)) # Initiate ACH file
-        entries=[]
-        for j in range (2,len(lines)): # Read lines
-            if lines[j][3:11] == banks[i][0]: # If match for destination (RDFI)
-                # Add an entry
-                routing_number = lines[j][3:11] # RDFI bank (customer's bank)
-                account_number = lines[j][12:29] # Customer account number
-                amount = str(float(lines[j][29:39])/100) # Amount
-                name = lines[j][54:76] # Customer name
-                entries.append({
-                    'type'           : '27',  #  We're creatign debits only
-                    'routing_number' : routing_number,
-                    'account_number' : account_number,
-                    'amount'         : amount,
-                    'name'           : name
-                })
-        if len(entries) != 0: #We have transactions
-            ach_file.add_batch('POS', entries, credits=True, debits=True)
-            # Save generated file to merchant-upload bucket
-            bucket_name = 'ach-rdfi-' + banks[i][0] # Based on RDFI rounting number
-            file_name = str(uuid.uuid4()) + '.ach' # Generate unique name
-            ach_content = ach_file.render_to_string()
-            save_file(bucket_name, file_name, ach_content)
-
-def update_rdfi_split():
+    storage.get_client().delete_object(Bucket=bucket_name,Key=object_key)
+
+
+def split_file_name(object_key, routing_number):
+    # Same name when the file is split again, a redelivery overwrites the
+    # files instead of adding new ones
+    return os.path.splitext(object_key)[0] + '-' + routing_number + '.ach'
+
+def create_ach_files(stream, object_key):
+    def open_writer(routing_number, settings):
+        bucket_name = 'ach-rdfi-' + routing_number # Based on RDFI rounting number
+        file_name = split_file_name(object_key, routing_number)
+        sink = S3MultipartSink(storage.get_client(), bucket_name, file_name,
+                               part_size=upload_part_size)
+        return AchWriter(sink, 'A', settings)
+
+    # Entries are streamed to the file of their RDFI in one pass over the file
+    writers = write_partitions(StreamParser(stream).lines(), get_routing_table(), open_writer,
+                               max_writers=max_open_files)
+    close_files(list(writers.values()))
+
+def update_rdfi_split(entries=1):
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO rdfi_split(time,entry) SELECT CURRENT_TIMESTAMP(), 1;'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        metrics_writer.record('rdfi_split', entry=entries)
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
-def run_event(event):
+def process_record(record):
     try:
-        extracted_data = extract_data(event)
+        extracted_data = extract_data(record)
         bucket_eventName = extracted_data['bucket_eventName']
         bucket_name = extracted_data['bucket_name']
         object_key = extracted_data['object_key']
         logging.info(bucket_eventName + ' ' + bucket_name + ' ' + object_key)
 
-        if bucket_eventName == 's3:ObjectCreated:Put':
+        if bucket_eventName.startswith('s3:ObjectCreated:'):
             # Load file and treat it
-            content = load_file(bucket_name, object_key)
-            create_ach_files(content)
-            update_rdfi_split()
+            stream = open_file(bucket_name, object_key)
+            create_ach_files(stream, object_key)
             delete_file(bucket_name, object_key)
-            
+            return True
+
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
 
-client = CloudeventsServer()
-client.start_receiver(run_event)
+def run_event(records):
+    report = notifications.process_batch(records, process_record, record_concurrency)
+    processed = sum(1 for result in report['processed'].values() if result)
+    if processed:
+        update_rdfi_split(processed)  # One counter row for the whole batch
+    return report
+
+
+def create_readiness():
+    # Clients created before the service is ready, instead of at import
+    return serving.Readiness([
+        ('routing_table', get_routing_table),
+        ('storage', storage.get_client),
+        ('database', helper_db.get_pool),
+        ('metrics', metrics_writer.start),
+    ])
+
+
+def create_app():
+    """
+    Returns the receiver of the service, warmed up when it starts serving
+    """
+    return CloudeventsServer(mode=serving_mode, workers=serving_workers,
+                             on_shutdown=[metrics_writer.close],
+                             readiness=create_readiness())
+
+
+def main():
+    if event_source == 'kafka':
+        create_readiness().warm()
+        consumer.consume(run_event, kafka_topic, kafka_bootstrap_servers, kafka_group_id,
+                         decode=notifications.decode,
+                         max_poll_records=kafka_max_poll_records,
+                         max_in_flight=kafka_max_in_flight,
+                         max_attempts=kafka_max_attempts,
+                         dead_letter_topic=kafka_dead_letter_topic,
+                         on_shutdown=[metrics_writer.close])
+    else:
+        create_app().start_receiver(run_event)
+
+
+if __name__ == '__main__':
+    main()
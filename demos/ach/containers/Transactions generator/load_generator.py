@@ -0,0 +1,194 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+"""
+Load generator mode of the transaction generator
+
+Files are started at a fixed target rate (open loop) by a pool of workers
+that reuse the clients of the process, instead of one Job pod per file.
+The entries are sampled from pools of names, account numbers and amounts
+drawn once at startup. The latency of each file is measured from the time
+it was scheduled, so a generator falling behind its target shows up in the
+percentiles and not only in the achieved rate.
+"""
+
+
+class EntryPools(object):
+    """
+    Names, account numbers and amounts sampled to build the entries
+    """
+
+    def __init__(self, routing_numbers, get_name, size=1000, seed=None):
+        """
+        :param routing_numbers: RDFI routing numbers, without check digit
+        :param get_name: returns a random full name, called size times
+        """
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.routing_numbers = list(routing_numbers)
+        self.names = [get_name() for _ in range(size)]
+        self.account_numbers = [str(account) for account in
+                                self.rng.integers(111111111, 999999999, size, endpoint=True)]
+        # Amounts between 1.00 and 2000.00, formatted as by the job mode
+        self.amounts = [str(cents / 100) for cents in
+                        self.rng.integers(100, 200000, size, endpoint=True).tolist()]
+
+    def draw(self, count, high):
+        # The Generator is shared by the workers and is not thread-safe
+        with self.lock:
+            return self.rng.integers(0, high, count).tolist()
+
+    def entries(self, count):
+        """
+        Yields count debit entries
+        """
+        size = len(self.names)
+        banks = self.draw(count, len(self.routing_numbers))
+        names = self.draw(count, size)
+        accounts = self.draw(count, size)
+        amounts = self.draw(count, size)
+        for i in range(count):
+            yield {
+                'type': '27',
+                'routing_number': self.routing_numbers[banks[i]],
+                'account_number': self.account_numbers[accounts[i]],
+                'amount': self.amounts[amounts[i]],
+                'name': self.names[names[i]],
+            }
+
+
+class EntryCount(object):
+    """
+    Distribution of the number of entries per file, 'uniform' between
+    minimum and maximum, or 'lognormal' around their geometric mean and
+    clipped to them
+    """
+
+    def __init__(self, minimum=300, maximum=500, distribution='uniform', sigma=0.5, seed=None):
+        if distribution not in ('uniform', 'lognormal'):
+            raise ValueError('unknown entries distribution {}'.format(distribution))
+        if not 0 < minimum <= maximum:
+            raise ValueError('entries range {}-{} is invalid'.format(minimum, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.distribution = distribution
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.distribution == 'uniform':
+                return int(self.rng.integers(self.minimum, self.maximum, endpoint=True))
+            median = math.sqrt(self.minimum * self.maximum)
+            count = round(self.rng.lognormal(math.log(median), self.sigma))
+        return min(max(count, self.minimum), self.maximum)
+
+
+class LoadGenerator(object):
+    """
+    Calls generate(entries) target_rate times per second with the entries
+    of a file, until stop() or the end of duration
+    """
+
+    def __init__(self, generate, pools, entry_count, target_rate=1.0, workers=8,
+                 duration=0, report_interval=10):
+        """
+        :param generate: writes one file of the entries it is given
+        :param duration: seconds to run, 0 runs until stop()
+        """
+        if target_rate <= 0:
+            raise ValueError('target_rate must be positive')
+        self.generate = generate
+        self.pools = pools
+        self.entry_count = entry_count
+        self.target_rate = target_rate
+        self.workers = workers
+        self.duration = duration
+        self.report_interval = report_interval
+        self.running = False
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.files = 0
+        self.entries = 0
+        self.errors = 0
+        # At most this many files wait for a worker, the schedule slips beyond it
+        self.slots = threading.BoundedSemaphore(workers * 2)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        """
+        Returns the report of the run
+        """
+        self.running = True
+        start = time.perf_counter()
+        last_report = start
+        scheduled = 0
+
+        logging.info('generating {} file(s)/s with {} workers'.format(self.target_rate, self.workers))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while self.running:
+                due = start + scheduled / self.target_rate
+                now = time.perf_counter()
+                # Past the end of the run, or no file left to start before it
+                if self.duration and max(due, now) - start >= self.duration:
+                    break
+                if due > now:
+                    time.sleep(min(due - now, 0.1))
+                    continue
+
+                self.slots.acquire()
+                executor.submit(self.run_file, due)
+                scheduled += 1
+
+                if now - last_report >= self.report_interval:
+                    logging.info('load: {}'.format(self.report(now - start)))
+                    last_report = now
+
+        report = self.report(time.perf_counter() - start)
+        logging.info('load finished: {}'.format(report))
+        return report
+
+    def run_file(self, due):
+        try:
+            count = self.entry_count.sample()
+            self.generate(self.pools.entries(count))
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            with self.lock:
+                self.errors += 1
+        else:
+            latency = time.perf_counter() - due
+            with self.lock:
+                self.files += 1
+                self.entries += count
+                self.latencies.append(latency)
+        finally:
+            self.slots.release()
+
+    def report(self, elapsed):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            report = {
+                'files': self.files,
+                'entries': self.entries,
+                'errors': self.errors,
+                'target_rate': self.target_rate,
+                'achieved_rate': round(self.files / elapsed, 2) if elapsed else 0.0,
+            }
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist()
+            report.update({
+                'latency_p50_ms': round(p50 * 1000, 1),
+                'latency_p90_ms': round(p90 * 1000, 1),
+                'latency_p99_ms': round(p99 * 1000, 1),
+                'latency_max_ms': round(float(latencies.max()) * 1000, 1),
+            })
+        return report
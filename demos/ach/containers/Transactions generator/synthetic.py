@@ -0,0 +1,179 @@
+import numpy as np
+
+import names
+from ach.data_types import EntryDetail, validate_alpha_numeric_field
+from ach.parser import Parser
+from ach.writer import CREDIT_CODES, DEBIT_CODES
+
+"""
+Vectorized generation of synthetic entries
+
+The banks, account numbers, amounts in cents and names of a block of
+entries are drawn as arrays from a seeded NumPy Generator, and the Entry
+Detail records are written column by column into a byte array holding the
+whole block, without an EntryDetail object or a dict per entry. The same
+seed gives the same entries, for reproducible benchmark inputs.
+
+    entries = SyntheticEntries(routing_numbers, load_vocabulary(10000, seed=1), seed=1)
+    with AchWriter(sink, 'A', settings) as writer:
+        writer.start_batch('PPD', credits=True, debits=True)
+        entries.write(writer, 1000000)
+"""
+
+# SEC codes whose entries have the layout of Parser.ENTRY_DETAIL_DEF
+SEC_CODES = ['PPD', 'CCD', 'POS', 'WEB', 'TEL']
+
+# Entries and addenda of a batch, the length of the Batch Control entadd_count
+MAX_BATCH_ENTRIES = 999999
+
+
+def columns(name):
+    for rule in Parser.ENTRY_DETAIL_DEF:
+        if rule['field'].strip() == name:
+            return slice(rule['pos'], rule['pos'] + rule['len'])
+    raise KeyError(name)
+
+
+def digits(values, width):
+    """
+    Returns the zero-padded decimal digits of int64 values, as ASCII codes
+    """
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values[:, None] // powers % 10 + ord('0')).astype(np.uint8)
+
+
+def check_digit(routing_number):
+    multipliers = [3, 7, 1, 3, 7, 1, 3, 7]
+    total = sum(int(num) * mult for num, mult in zip(routing_number, multipliers))
+    return str(-total % 10)
+
+
+def read_names(path):
+    with open(path) as f:
+        return [line.split()[0] for line in f if line.strip()]
+
+
+def load_vocabulary(size, seed=None):
+    """
+    Returns size full names combining the first and last names of the
+    names package
+    """
+    rng = np.random.default_rng(seed)
+    first = read_names(names.FILES['first:male']) + read_names(names.FILES['first:female'])
+    last = read_names(names.FILES['last'])
+    return [first[i] + ' ' + last[j] for i, j in
+            zip(rng.integers(0, len(first), size).tolist(),
+                rng.integers(0, len(last), size).tolist())]
+
+
+class SyntheticEntries(object):
+    """
+    Draws blocks of entries and renders them as Entry Detail records
+    """
+
+    ACCOUNT = columns('dfi_acnt_num')
+    AMOUNT = columns('amount')
+    TRANSACTION_CODE = columns('transaction_code')
+    ROUTING = slice(columns('recv_dfi_id').start, columns('check_digit').stop)
+    NAME = columns('ind_name')
+    TRACE = columns('trace_num')
+
+    def __init__(self, routing_numbers, vocabulary, seed=None,
+                 transaction_codes=('27',), min_amount=100, max_amount=200000):
+        """
+        :param routing_numbers: routing numbers of the RDFIs, without check digit
+        :param vocabulary: names of the account holders
+        :param min_amount: smallest amount, in cents, max_amount the largest
+        """
+        self.rng = np.random.default_rng(seed)
+        self.routing_numbers = np.array([routing[:8] + check_digit(routing[:8])
+                                         for routing in routing_numbers], dtype='S9')
+        self.routing_hashes = np.array([int(routing[:8]) for routing in routing_numbers],
+                                       dtype=np.int64)
+        # Names as rendered by the EntryDetail of the records path
+        self.names = np.array([validate_alpha_numeric_field(name.upper()[:22], 22)
+                               for name in vocabulary], dtype='S22')
+        self.transaction_codes = np.array(transaction_codes, dtype='S2')
+        self.is_debit = np.isin(np.array(transaction_codes), DEBIT_CODES)
+        self.is_credit = np.isin(np.array(transaction_codes), CREDIT_CODES)
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def draw(self, count):
+        """
+        Returns the arrays of a block of count entries
+        """
+        return {
+            'bank': self.rng.integers(0, len(self.routing_numbers), count),
+            'account': self.rng.integers(111111111, 999999999, count, endpoint=True),
+            'amount': self.rng.integers(self.min_amount, self.max_amount, count, endpoint=True),
+            'name': self.rng.integers(0, len(self.names), count),
+            'type': self.rng.integers(0, len(self.transaction_codes), count),
+        }
+
+    def records(self, block):
+        """
+        Returns the entries of a block as the records of AchFile.add_batch
+        """
+        return [{
+            'type': self.transaction_codes[code].decode(),
+            'routing_number': self.routing_numbers[bank].decode(),
+            'account_number': str(account),
+            'amount': str(amount / 100),
+            'name': self.names[name].decode().strip(),
+        } for bank, account, amount, name, code in zip(
+            block['bank'].tolist(), block['account'].tolist(), block['amount'].tolist(),
+            block['name'].tolist(), block['type'].tolist())]
+
+    def totals(self, block):
+        """
+        Returns the entry hash, debit amount and credit amount of a block
+        """
+        amounts = block['amount']
+        return (int(self.routing_hashes[block['bank']].sum()),
+                int(amounts[self.is_debit[block['type']]].sum()),
+                int(amounts[self.is_credit[block['type']]].sum()))
+
+    def render(self, block, std_ent_cls_code, trace_prefix, first_trace, line_ending='\n'):
+        """
+        Returns the Entry Detail records of a block as bytes, their trace
+        numbers are trace_prefix followed by first_trace, first_trace + 1...
+        """
+        if std_ent_cls_code not in SEC_CODES:
+            raise ValueError('entries of {} are not supported'.format(std_ent_cls_code))
+        count = len(block['amount'])
+        if first_trace + count - 1 > MAX_BATCH_ENTRIES:
+            raise ValueError('more than {} entries in a batch'.format(MAX_BATCH_ENTRIES))
+
+        # The constant fields come from an entry rendered by EntryDetail
+        template = EntryDetail(std_ent_cls_code, transaction_code='27',
+                               recv_dfi_id='00000000', dfi_acnt_num=' ', amount=0,
+                               ind_name=' ', trace_num=trace_prefix + '0' * 7)
+        template.check_digit = 0
+        row = (template.get_row() + line_ending).encode('ascii')
+
+        rows = np.empty((count, len(row)), dtype=np.uint8)
+        rows[:] = np.frombuffer(row, dtype=np.uint8)
+        rows[:, self.TRANSACTION_CODE] = \
+            self.transaction_codes[block['type']].view(np.uint8).reshape(count, 2)
+        rows[:, self.ROUTING] = self.routing_numbers[block['bank']].view(np.uint8).reshape(count, 9)
+        rows[:, self.ACCOUNT.start:self.ACCOUNT.start + 9] = digits(block['account'], 9)
+        rows[:, self.AMOUNT] = digits(block['amount'], self.AMOUNT.stop - self.AMOUNT.start)
+        rows[:, self.NAME] = self.names[block['name']].view(np.uint8).reshape(count, 22)
+        rows[:, self.TRACE.stop - 7:self.TRACE.stop] = \
+            digits(np.arange(first_trace, first_trace + count, dtype=np.int64), 7)
+        return rows.tobytes()
+
+    def write(self, writer, count, block_size=100000):
+        """
+        Writes count entries to the open batch of an AchWriter, block by block
+        """
+        std_ent_cls_code = writer.batch.batch_header.std_ent_cls_code
+        trace_prefix = writer.ach_file.settings['immediate_dest'][:8]
+        while count > 0:
+            block = self.draw(min(count, block_size))
+            size = len(block['amount'])
+            rows = self.render(block, std_ent_cls_code, trace_prefix,
+                               writer.batch.entry_counter + 1, writer.line_ending)
+            writer.add_rendered_entries(rows, size, *self.totals(block))
+            count -= size
@@ -2,14 +2,17 @@ import logging
 import math
 import os
 import random
+import signal
 import sys
 import uuid
 
-import boto3
 import names
 
-import mysql.connector
-from ach.builder import AchFile
+import helper_db
+import load_generator
+import storage
+import synthetic
+from ach.writer import AchWriter, S3MultipartSink
 
 # banks format = (routing without check_digit, name)
 banks = [
@@ -38,28 +41,38 @@ companies = [
 
 companies_banks = [1,2,3,4,5,6,0,1,2,3]
 
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
-
-db_user = os.environ['database-user']
-db_password = os.environ['database-password']
-db_host = os.environ['database-host']
-db_db = os.environ['database-db']
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point')
+
+db_user = os.environ.get('database-user')
+db_password = os.environ.get('database-password')
+db_host = os.environ.get('database-host')
+db_db = os.environ.get('database-db')
+
+# 'job' writes a single file, 'load' generates files at target_rate until
+# the end of load_duration (0: until SIGTERM)
+generator_mode = os.environ.get('generator_mode', 'job')
+target_rate = float(os.environ.get('target_rate', '1'))
+load_duration = float(os.environ.get('load_duration', '0'))
+load_workers = int(os.environ.get('load_workers', '8'))
+entries_min = int(os.environ.get('entries_min', '300'))
+entries_max = int(os.environ.get('entries_max', '500'))
+entries_distribution = os.environ.get('entries_distribution', 'uniform')
+pool_size = int(os.environ.get('pool_size', '1000'))
+report_interval = float(os.environ.get('report_interval', '10'))
+
+# In job mode, a file of synthetic_entries vectorized entries instead of
+# 300-500 generated one by one, generator_seed makes it reproducible
+synthetic_entries = int(os.environ.get('synthetic_entries', '0'))
+generator_seed = int(os.environ['generator_seed']) if os.environ.get('generator_seed') else None
+
+helper_db.configure(db_user, db_password, db_host, db_db,
+                    pool_size=load_workers if generator_mode == 'load' else 1)
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-s3client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
-                        aws_access_key_id=access_key,
-                        aws_secret_access_key=secret_key,
-                        use_ssl=True if 'https' in service_point else False)
-
-def save_file(bucket_name, file_name, content):
-    sent_data = s3client.put_object(
-        Bucket=bucket_name, Key=file_name, Body=content)
-    if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
-        raise logging.error(
-            'Failed to upload file {} to bucket {}'.format(file_name, bucket_name))
+storage.configure(service_point, access_key, secret_key)
 
 def calc_check_digit(entry):
     multipliers = [3, 7, 1, 3, 7, 1, 3, 7]
@@ -89,54 +102,80 @@ def create_setting_entry():
 
     return settings
 
-# Create random transaction entries
+# Create random transaction entries, one at a time
 def create_transactions_entries():
     max_entries = random.randint(300,500)  # Number of transactions per files
-    entries=[]
     for x in range (1,max_entries):
         routing_number = banks[random.randint(0,6)][0][0:8] # Randomly select an RDFI bank (customer's bank)
         account_number = str(random.randint(111111111,999999999))   # Random customer account number
         amount = str(random.randint(100,200000)/100)  # Random amount between 1.00 and 2000.00
         name = names.get_full_name()  #  Generates random names
-        entries.append({
+        yield {
             'type'           : '27',  #  We're creating debits only
             'routing_number' : routing_number,
             'account_number' : account_number,
             'amount'         : amount,
             'name'           : name
 
-        })     
-    
-    return entries
+        }
 
 def update_merchant_upload():
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO merchant_upload(time,entry) SELECT CURRENT_TIMESTAMP(), 1;'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        helper_db.execute('INSERT INTO merchant_upload(time,entry) SELECT CURRENT_TIMESTAMP(), 1')
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
-# Initialize a new ACH file
-ach_file = AchFile('A', create_setting_entry())
-
-# Create entries
-entries = create_transactions_entries()
-
-# Populate ACH file with generated entries
-ach_file.add_batch('POS', entries, credits=True, debits=True)
-
-# Save generated file to merchant-upload bucket
-bucket_name = 'ach-merchant-upload'
-file_name = str(uuid.uuid4()) + '.ach'
-content = ach_file.render_to_string()
-save_file(bucket_name, file_name, content)
-update_merchant_upload()
+def generate_file(entries):
+    # Generated file is written to merchant-upload bucket while its entries are created
+    bucket_name = 'ach-merchant-upload'
+    file_name = str(uuid.uuid4()) + '.ach'
+    sink = S3MultipartSink(storage.get_client(), bucket_name, file_name)
+
+    # Populate ACH file with generated entries
+    with AchWriter(sink, 'A', create_setting_entry()) as writer:
+        writer.add_batch('POS', entries, credits=True, debits=True)
+
+    update_merchant_upload()
+
+def generate_synthetic_file(count):
+    entries = synthetic.SyntheticEntries([bank[0][0:8] for bank in banks],
+                                         synthetic.load_vocabulary(pool_size, generator_seed),
+                                         seed=generator_seed)
+    bucket_name = 'ach-merchant-upload'
+    file_name = str(uuid.uuid4()) + '.ach'
+    sink = S3MultipartSink(storage.get_client(), bucket_name, file_name)
+
+    # A batch holds at most MAX_BATCH_ENTRIES entries
+    with AchWriter(sink, 'A', create_setting_entry()) as writer:
+        while count > 0:
+            batch_entries = min(count, synthetic.MAX_BATCH_ENTRIES)
+            writer.start_batch('POS', credits=True, debits=True)
+            entries.write(writer, batch_entries)
+            count -= batch_entries
+
+    update_merchant_upload()
+
+def generate_load():
+    pools = load_generator.EntryPools([bank[0][0:8] for bank in banks],
+                                      names.get_full_name, size=pool_size)
+    entry_count = load_generator.EntryCount(entries_min, entries_max, entries_distribution)
+    generator = load_generator.LoadGenerator(generate_file, pools, entry_count,
+                                             target_rate=target_rate,
+                                             workers=load_workers,
+                                             duration=load_duration,
+                                             report_interval=report_interval)
+    signal.signal(signal.SIGTERM, lambda signum, frame: generator.stop())
+    generator.run()
+
+def main():
+    if generator_mode == 'load':
+        generate_load()
+    elif synthetic_entries:
+        generate_synthetic_file(synthetic_entries)
+    else:
+        generate_file(create_transactions_entries())
+
+if __name__ == '__main__':
+    main()
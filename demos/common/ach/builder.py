@@ -3,7 +3,8 @@ from datetime import datetime, timedelta
 
 from .data_types import (
     Header, FileControl, BatchHeader,
-    BatchControl, EntryDetail, AddendaRecord
+    BatchControl, EntryDetail, AddendaRecord,
+    validate_numeric_field
 )
 
 
@@ -36,6 +37,21 @@ class AchFile(object):
 
         self.batches = list()
 
+        # Running totals of the batches, the File Control record is only
+        # built from them when it is needed
+        self.batch_count = 0
+        self.entadd_count = 0
+        self.entry_hash = 0
+        self.debit_amount = 0
+        self.credit_amount = 0
+        self.file_control = None
+
+    @property
+    def control(self):
+        if self.file_control is None:
+            self.set_control()
+        return self.file_control
+
     def add_batch(self, std_ent_cls_code, batch_entries=None,
                   credits=True, debits=False, eff_ent_date=None,
                   company_id=None):
@@ -46,9 +62,30 @@ class AchFile(object):
         if batch_entries is None:
             batch_entries = list()
 
+        batch_header = self.create_batch_header(
+            std_ent_cls_code, credits, debits, eff_ent_date, company_id)
+
+        entries = list()
+        entry_counter = 1
+
+        for record in batch_entries:
+            entry = self.create_entry(std_ent_cls_code, record, entry_counter)
+            entries.append((entry, record.get('addenda', [])))
+            entry_counter += 1
+
+        batch = FileBatch(batch_header, entries)
+        self.batches.append(batch)
+        self.add_totals(batch)
+
+    def create_batch_header(self, std_ent_cls_code, credits=True,
+                            debits=False, eff_ent_date=None,
+                            company_id=None):
+        """
+        Returns the header of the next batch of the file
+        """
         entry_desc = self.get_entry_desc(std_ent_cls_code)
 
-        batch_count = len(self.batches) + 1
+        batch_count = self.batch_count + 1
 
         if not eff_ent_date:
             eff_ent_date = datetime.today() + timedelta(days=1)
@@ -60,7 +97,7 @@ class AchFile(object):
         elif debits:
             serv_cls_code = '225'
 
-        batch_header = BatchHeader(
+        return BatchHeader(
             serv_cls_code=serv_cls_code,
             batch_id=batch_count,
             company_id=company_id or self.settings['company_id'],
@@ -73,47 +110,58 @@ class AchFile(object):
             company_name=self.settings['immediate_org_name']
         )
 
-        entries = list()
-        entry_counter = 1
-
-        for record in batch_entries:
-
-            entry = EntryDetail(std_ent_cls_code)
-
-            entry.transaction_code = record.get('type')
-            entry.recv_dfi_id = record.get('routing_number')
-
-            if len(record['routing_number']) < 9:
-                entry.calc_check_digit()
-            else:
-                entry.check_digit = record['routing_number'][8]
+    def create_entry(self, std_ent_cls_code, record, entry_counter):
+        """
+        Returns the EntryDetail of a record of a batch, entry_counter is its
+        position in the batch, starting at 1
+        """
+        # All the fields are validated and formatted in one call
+        entry = EntryDetail(
+            std_ent_cls_code,
+            transaction_code=record.get('type'),
+            recv_dfi_id=record.get('routing_number'),
+            dfi_acnt_num=record['account_number'],
+            amount=int(round(float(record['amount']) * 100)),
+            ind_name=record['name'].upper()[:22],
+            trace_num=self.settings['immediate_dest'][:8]
+            + validate_numeric_field(entry_counter, 7)
+        )
 
-            entry.dfi_acnt_num = record['account_number']
-            entry.amount = int(round(float(record['amount']) * 100))
-            entry.ind_name = record['name'].upper()[:22]
-            entry.trace_num = self.settings['immediate_dest'][:8] \
-                + entry.validate_numeric_field(entry_counter, 7)
+        if len(record['routing_number']) < 9:
+            entry.calc_check_digit()
+        else:
+            entry.check_digit = record['routing_number'][8]
 
-            entries.append((entry, record.get('addenda', [])))
-            entry_counter += 1
+        return entry
 
-        self.batches.append(FileBatch(batch_header, entries))
-        self.set_control()
+    def add_totals(self, batch):
+        """
+        Adds the totals of a batch to the running totals of the file
+        """
+        self.batch_count += 1
+        self.entadd_count += batch.entadd_count
+        self.entry_hash += batch.entry_hash
+        self.debit_amount += batch.debit_amount
+        self.credit_amount += batch.credit_amount
+        self.file_control = None
 
     def set_control(self):
 
-        batch_count = len(self.batches)
-        block_count = self.get_block_count(self.batches)
-        entry_hash = self.get_entry_hash(self.batches)
-        entadd_count = self.get_entadd_count(self.batches)
-        debit_amount = self.get_debit_amount(self.batches)
-        credit_amount = self.get_credit_amount(self.batches)
+        batch_count = self.batch_count
+        block_count = int(math.ceil(self.count_lines() / 10.0))
+        entry_hash = str(self.entry_hash)[-10:]
 
-        self.control = FileControl(
-            batch_count, block_count, entadd_count,
-            entry_hash, debit_amount, credit_amount
+        self.file_control = FileControl(
+            batch_count, block_count, self.entadd_count,
+            entry_hash, self.debit_amount, self.credit_amount
         )
 
+    def count_lines(self):
+        """
+        Number of records of the file, without the blocking filler
+        """
+        return 2 + 2 * self.batch_count + self.entadd_count
+
     def get_block_count(self, batches):
 
         return int(math.ceil(self.get_lines(batches) / 10.0))
@@ -135,7 +183,7 @@ class AchFile(object):
         entadd_count = 0
 
         for batch in batches:
-            entadd_count = entadd_count + int(batch.batch_control.entadd_count)
+            entadd_count = entadd_count + batch.entadd_count
 
         return entadd_count
 
@@ -143,7 +191,7 @@ class AchFile(object):
         entry_hash = 0
 
         for batch in batches:
-            entry_hash = entry_hash + int(batch.batch_control.entry_hash)
+            entry_hash = entry_hash + batch.entry_hash
 
         if len(str(entry_hash)) > 10:
             pos = len(str(entry_hash)) - 10
@@ -157,7 +205,7 @@ class AchFile(object):
         debit_amount = 0
 
         for batch in batches:
-            debit_amount = debit_amount + int(batch.batch_control.debit_amount)
+            debit_amount = debit_amount + batch.debit_amount
 
         return debit_amount
 
@@ -165,21 +213,12 @@ class AchFile(object):
         credit_amount = 0
 
         for batch in batches:
-            credit_amount = credit_amount + \
-                int(batch.batch_control.credit_amount)
+            credit_amount = credit_amount + batch.credit_amount
 
         return credit_amount
 
     def get_nines(self, rows, line_ending):
-        nines = ''
-
-        for i in range(rows):
-            nines += '9'*94
-            if i == rows - 1:
-                continue
-            nines += line_ending
-
-        return nines
+        return line_ending.join(['9' * 94] * rows)
 
     def get_entry_desc(self, std_ent_cls_code):
 
@@ -198,24 +237,45 @@ class AchFile(object):
         """
         Renders a nacha file as a string
         """
+        return ''.join(self.iter_lines(force_crlf=force_crlf))
+
+    def render(self, stream, force_crlf=False):
+        """
+        Writes a nacha file to a text stream, line by line
+        """
+        stream.writelines(self.iter_lines(force_crlf=force_crlf))
+
+    def iter_lines(self, force_crlf=False):
+        """
+        Yields the lines of a nacha file with their line ending, the last
+        blocking filler line has none
+        """
         line_ending = "\n"
         if force_crlf:
             line_ending = "\r\n"
 
-        ret_string = self.header.get_row() + line_ending
+        yield self.header.get_row() + line_ending
 
         for batch in self.batches:
-            ret_string += batch.render_to_string(force_crlf=force_crlf)
+            yield from batch.iter_lines(force_crlf=force_crlf)
+
+        yield from self.iter_control_lines(line_ending)
 
-        ret_string += self.control.get_row() + line_ending
+    def iter_control_lines(self, line_ending):
+        """
+        Yields the File Control record and the blocking filler lines
+        """
+        yield self.control.get_row() + line_ending
 
-        lines = self.get_lines(self.batches)
+        lines = self.count_lines()
 
         nine_lines = int(round(10 * (math.ceil(lines / 10.0) - (lines / 10.0))))
 
-        ret_string += self.get_nines(nine_lines, line_ending)
-
-        return ret_string
+        if nine_lines:
+            nines = '9' * 94
+            for i in range(nine_lines - 1):
+                yield nines + line_ending
+            yield nines
 
 
 class FileBatch(object):
@@ -242,19 +302,31 @@ class FileBatch(object):
             entadd_count += len(addenda)
             self.entries.append(FileEntry(entry, addenda))
 
-        #set up batch_control
+        # Totals of the batch, as integers, for the file totals
+        self.entadd_count = entadd_count
+        self.entry_hash = int(self.get_entry_hash(self.entries))
+        self.debit_amount = self.get_debit_amount(self.entries)
+        self.credit_amount = self.get_credit_amount(self.entries)
 
-        batch_control = BatchControl(self.batch_header.serv_cls_code)
+        self.batch_control = self.create_control(self.batch_header, self)
 
-        batch_control.entadd_count = entadd_count
-        batch_control.entry_hash = self.get_entry_hash(self.entries)
-        batch_control.debit_amount = self.get_debit_amount(self.entries)
-        batch_control.credit_amount = self.get_credit_amount(self.entries)
-        batch_control.company_id = self.batch_header.company_id
-        batch_control.orig_dfi_id = self.batch_header.orig_dfi_id
-        batch_control.batch_id = self.batch_header.batch_id
+    @staticmethod
+    def create_control(batch_header, totals):
+        """
+        Returns the BatchControl of a batch, totals holds its entadd_count,
+        entry_hash, debit_amount and credit_amount
+        """
+        batch_control = BatchControl(batch_header.serv_cls_code)
 
-        self.batch_control = batch_control
+        batch_control.entadd_count = totals.entadd_count
+        batch_control.entry_hash = totals.entry_hash
+        batch_control.debit_amount = totals.debit_amount
+        batch_control.credit_amount = totals.credit_amount
+        batch_control.company_id = batch_header.company_id
+        batch_control.orig_dfi_id = batch_header.orig_dfi_id
+        batch_control.batch_id = batch_header.batch_id
+
+        return batch_control
 
     def get_entry_hash(self, entries):
 
@@ -295,18 +367,25 @@ class FileBatch(object):
         """
         Renders a nacha file batch to string
         """
+        return ''.join(self.iter_lines(force_crlf=force_crlf))
+
+    def iter_lines(self, force_crlf=False):
+        """
+        Yields the lines of a nacha file batch with their line ending
+        """
         line_ending = "\n"
         if force_crlf:
             line_ending = "\r\n"
 
-        ret_string = self.batch_header.get_row() + line_ending
+        yield self.batch_header.get_row() + line_ending
 
         for entry in self.entries:
-            ret_string += entry.render_to_string(force_crlf=force_crlf)
-
-        ret_string += self.batch_control.get_row() + line_ending
+            # Same as entry.iter_lines(), without a generator per entry
+            yield entry.entry_detail.get_row() + line_ending
+            for addenda in entry.addenda_record:
+                yield addenda.get_row() + line_ending
 
-        return ret_string
+        yield self.batch_control.get_row() + line_ending
 
 
 class FileEntry(object):
@@ -342,13 +421,17 @@ class FileEntry(object):
         """
         Renders a nacha batch entry and addenda to string
         """
+        return ''.join(self.iter_lines(force_crlf=force_crlf))
+
+    def iter_lines(self, force_crlf=False):
+        """
+        Yields the lines of a nacha batch entry and addenda with their line ending
+        """
         line_ending = "\n"
         if force_crlf:
             line_ending = "\r\n"
 
-        ret_string = self.entry_detail.get_row() + line_ending
+        yield self.entry_detail.get_row() + line_ending
 
         for addenda in self.addenda_record:
-            ret_string += addenda.get_row() + line_ending
-
-        return ret_string
+            yield addenda.get_row() + line_ending
@@ -0,0 +1,732 @@
+import math
+import re
+import string
+from datetime import datetime
+from operator import attrgetter
+
+"""
+Collection of classes that comprise the row type objects
+in a nacha file
+
+Each record class declares its fields once, in numeric_fields,
+alpha_numeric_fields and field_lengths. A codec is compiled from them when
+the class is created: a formatting function and a default value per field,
+and the getters of the fields of a row. Records use __slots__, and their
+constructor validates and formats all the fields in one call.
+"""
+
+ALPHA_NUMERIC = re.compile(r'[\w,\s]+')
+
+STD_ENT_CLS_CODES = ['ARC', 'PPD', 'CTX', 'POS', 'WEB',
+                     'BOC', 'TEL', 'MTE', 'SHR', 'CCD',
+                     'CIE', 'POP', 'RCK']
+
+
+class AchError(Exception):
+    pass
+
+
+def validate_alpha_numeric_field(field, length):
+    """
+    Validates alpha numeric fields for nacha files
+    field: (str)
+    length: (int)
+    """
+    match = ALPHA_NUMERIC.match(field)
+
+    if match is None:
+        raise AchError("field does not match alpha numeric criteria")
+
+    return match.group()[:length].ljust(length).upper()
+
+
+def validate_numeric_field(field, length):
+    """
+    Validates numeric field and zero right-pads if not
+    long enough.
+    field (int|str)
+    length (int)
+    """
+    field = str(field)
+
+    if not field.isdigit():
+        raise AchError("field needs to be numeric characters only")
+    if len(field) > length:
+        raise AchError("field can only be %s digits long" % length)
+
+    return field.zfill(length)
+
+
+def numeric(length):
+    def encode(record, value):
+        return validate_numeric_field(value, length)
+    return encode
+
+
+def alpha_numeric(length):
+    def encode(record, value):
+        return validate_alpha_numeric_field(value, length)
+    return encode
+
+
+def one_of(values, encode, name):
+    def encode_value(record, value):
+        if str(value) not in values:
+            raise AchError("%s not in %s" % (value, name))
+        return encode(record, value)
+    return encode_value
+
+
+class Ach(object):
+    """
+    Base class for ACH record fields
+    """
+
+    __slots__ = ()
+
+    numeric_fields = []
+    alpha_numeric_fields = []
+    field_lengths = {}
+
+    # Fields that get their default value when set to '' in the
+    # constructor, the others go through their encoder and '' is an error
+    optional_fields = ()
+
+    unknown_field_error = '%s not in numeric_fields or alpha_numeric_fields'
+
+    # Names of the fields of a row, in order
+    row_fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.encoders = cls.compile_encoders()
+        cls.defaults = {name: value
+                        for name, value in cls.compile_defaults().items()
+                        if name in cls.optional_fields}
+        cls.row_getter = attrgetter(*cls.row_fields) if cls.row_fields else None
+
+    @classmethod
+    def compile_encoders(cls):
+        encoders = {}
+
+        # Fields with several lengths have their own encoder
+        for name in cls.numeric_fields:
+            if isinstance(cls.field_lengths[name], int):
+                encoders[name] = numeric(cls.field_lengths[name])
+        for name in cls.alpha_numeric_fields:
+            if isinstance(cls.field_lengths[name], int):
+                encoders[name] = alpha_numeric(cls.field_lengths[name])
+
+        return encoders
+
+    @classmethod
+    def compile_defaults(cls):
+        defaults = {}
+
+        # Fields with several lengths have their own default
+        for name in cls.numeric_fields:
+            if isinstance(cls.field_lengths[name], int):
+                defaults[name] = '0' * cls.field_lengths[name]
+        for name in cls.alpha_numeric_fields:
+            if isinstance(cls.field_lengths[name], int):
+                defaults[name] = ' ' * cls.field_lengths[name]
+
+        return defaults
+
+    def __setattr__(self, name, value):
+        try:
+            encode = self.encoders[name]
+        except KeyError:
+            raise AchError(self.unknown_field_error % name)
+
+        object.__setattr__(self, name, encode(self, value))
+
+    def load(self, fields):
+        """
+        Validates and sets all the fields at once, in order. The optional
+        fields set to '' get their default value.
+        """
+        encoders = self.encoders
+        defaults = self.defaults
+
+        for name, value in fields.items():
+            if value == '' and name in defaults:
+                value = defaults[name]
+            else:
+                try:
+                    encode = encoders[name]
+                except KeyError:
+                    raise AchError(self.unknown_field_error % name)
+                value = encode(self, value)
+            object.__setattr__(self, name, value)
+
+    def get_row(self):
+        """
+        returns concatenated string of all parameters in
+        nacha file
+        """
+        return ''.join(self.row_getter(self))
+
+    def get_count(self):
+        """
+        Returns length of all parameters in nach
+        file
+        """
+        return len(self.get_row())
+
+    def make_space(self, spaces=1):
+        """
+        Return string with x number of spaces
+        Defaults to 1
+        """
+        return ' ' * spaces
+
+    def make_right_justified(self, field, length):
+        """
+        Return string with x number of leading spaces depending on field length
+        Routing numbers should be 9 digits long, so we technically only need 1
+        leading space.
+        """
+        return field.rjust(length)
+
+    def make_zero(self, zeros=1):
+        """
+        Return string with x number of zeros
+        Defaults to 1
+        """
+        return '0' * zeros
+
+    def validate_alpha_numeric_field(self, field, length):
+        return validate_alpha_numeric_field(field, length)
+
+    def validate_numeric_field(self, field, length):
+        return validate_numeric_field(field, length)
+
+    def validate_binary_field(self, field):
+        """
+        Validates binary string field (either '1' or '0')
+        """
+
+        if field not in ['1', '0']:
+            raise AchError("filed not '1' or '0'")
+        return field
+
+
+class Header(Ach):
+    """
+    Creates our File Header record of the nacha file
+    """
+
+    record_type_code = '1'
+    priority_code = '01'
+    record_size = '094'
+    blk_factor = '10'
+    format_code = '1'
+
+    alpha_numeric_fields = [
+        'immediate_dest', 'immediate_org', 'file_id_mod', 'im_dest_name',
+        'im_orgn_name', 'reference_code', 'file_crt_date', 'file_crt_time'
+    ]
+
+    field_lengths = {
+        'immediate_dest': 10,
+        'immediate_org': 10,
+        'file_id_mod': 1,
+        'im_dest_name': 23,
+        'im_orgn_name': 23,
+        'reference_code': 8,
+        'file_crt_date': 6,
+        'file_crt_time': 4,
+    }
+
+    __slots__ = tuple(field_lengths)
+
+    optional_fields = ['reference_code']
+
+    unknown_field_error = '%s not in alpha numeric field list'
+
+    row_fields = (
+        'record_type_code', 'priority_code', 'immediate_dest',
+        'immediate_org', 'file_crt_date', 'file_crt_time', 'file_id_mod',
+        'record_size', 'blk_factor', 'format_code', 'im_dest_name',
+        'im_orgn_name', 'reference_code',
+    )
+
+    @classmethod
+    def compile_encoders(cls):
+        encoders = super().compile_encoders()
+        validate_alpha_numeric = encoders['file_id_mod']
+
+        def file_id_mod(record, value):
+            return validate_alpha_numeric(
+                record, cls.validate_file_id_mod(record, value))
+
+        encoders['file_id_mod'] = file_id_mod
+        return encoders
+
+    def __init__(self, immediate_dest='', immediate_org='', file_id_mod='A',
+                 im_dest_name='', im_orgn_name='', reference_code=''):
+        """
+        Initializes all values needed for
+        our header row
+        """
+
+        date = datetime.today()
+
+        self.load({
+            'immediate_dest': immediate_dest.rjust(10),
+            'immediate_org': immediate_org.rjust(10),
+            'file_crt_date': date.strftime('%y%m%d'),
+            'file_crt_time': date.strftime('%H%M'),
+            'file_id_mod': file_id_mod,
+            'im_dest_name': im_dest_name,
+            'im_orgn_name': im_orgn_name,
+            'reference_code': reference_code,
+        })
+
+    def validate_file_id_mod(self, file_id_mod):
+        '''
+        Validates the file ID modifier. It has to be ascii_uppercase
+        and one character in length
+        '''
+        if file_id_mod not in string.ascii_uppercase and len(file_id_mod) != 1:
+            raise AchError("Invalid file_id_mod")
+
+        return file_id_mod
+
+
+class FileControl(Ach):
+    """
+    Comprises the control record for an ACH file
+    Appears at the end of file
+    """
+
+    record_type_code = '9'
+
+    numeric_fields = [
+        'batch_count', 'block_count', 'entadd_count', 'entry_hash',
+        'debit_amount', 'credit_amount'
+    ]
+
+    alpha_numeric_fields = ['reserved', ]
+
+    field_lengths = {
+        'batch_count': 6,
+        'block_count': 6,
+        'entadd_count': 8,
+        'entry_hash': 10,
+        'debit_amount': 12,
+        'credit_amount': 12,
+        'reserved': 39,
+    }
+
+    __slots__ = tuple(field_lengths)
+
+    optional_fields = ['reserved']
+
+    unknown_field_error = '%s not in numeric field list'
+
+    row_fields = (
+        'record_type_code', 'batch_count', 'block_count', 'entadd_count',
+        'entry_hash', 'debit_amount', 'credit_amount', 'reserved',
+    )
+
+    def __init__(self, batch_count, block_count,
+                 entadd_count, entry_hash, debit_amount,
+                 credit_amount):
+        """
+        Initializes all the values we need for our file control record
+        """
+
+        self.load({
+            'batch_count': batch_count,
+            'block_count': block_count,
+            'entadd_count': entadd_count,
+            'entry_hash': entry_hash,
+            'debit_amount': debit_amount,
+            'credit_amount': credit_amount,
+            'reserved': '',
+        })
+
+
+class BatchHeader(Ach):
+
+    record_type_code = '5'
+
+    std_ent_cls_code_list = STD_ENT_CLS_CODES
+
+    serv_cls_code_list = ['200', '220', '225']
+
+    numeric_fields = ['orig_dfi_id', 'batch_id',
+                      'eff_ent_date', 'serv_cls_code']
+
+    alpha_numeric_fields = ['company_name', 'cmpy_dis_data', 'company_id',
+                            'std_ent_cls_code', 'entry_desc', 'desc_date',
+                            'orig_stat_code', 'settlement_date']
+
+    field_lengths = {
+        'serv_cls_code': 3,
+        'company_name': 16,
+        'cmpy_dis_data': 20,
+        'company_id': 10,
+        'std_ent_cls_code': 3,
+        'entry_desc': 10,
+        'desc_date': 6,
+        'eff_ent_date': 6,
+        'settlement_date': 3,
+        'orig_stat_code': 1,
+        'orig_dfi_id': 8,
+        'batch_id': 7,
+    }
+
+    __slots__ = tuple(field_lengths)
+
+    # The builder only sets some of the fields, the others are blank or zero
+    optional_fields = numeric_fields + alpha_numeric_fields
+
+    unknown_field_error = '%s not in numeric or alpha numeric fields list'
+
+    row_fields = (
+        'record_type_code', 'serv_cls_code', 'company_name', 'cmpy_dis_data',
+        'company_id', 'std_ent_cls_code', 'entry_desc', 'desc_date',
+        'eff_ent_date', 'settlement_date', 'orig_stat_code', 'orig_dfi_id',
+        'batch_id',
+    )
+
+    @classmethod
+    def compile_encoders(cls):
+        encoders = super().compile_encoders()
+        encoders['serv_cls_code'] = one_of(
+            cls.serv_cls_code_list, encoders['serv_cls_code'],
+            'serv_cls_code_list')
+        encoders['std_ent_cls_code'] = one_of(
+            cls.std_ent_cls_code_list, encoders['std_ent_cls_code'],
+            'std_ent_cls_code_list')
+        return encoders
+
+    def __init__(self, serv_cls_code='220', company_name='', cmpy_dis_data='',
+                 company_id='', std_ent_cls_code='PPD', entry_desc='',
+                 desc_date='', eff_ent_date='', orig_stat_code='',
+                 orig_dfi_id='', batch_id=''):
+        """
+        Initializes and validates the values for our Batch Header
+        rows. We use 220 and PPD as the default values for serv_cls_code
+        and std_ent_cls_code.
+        """
+
+        fields = locals().copy()
+        del fields['self']
+        fields['settlement_date'] = ''
+
+        self.load(fields)
+
+
+class BatchControl(Ach):
+
+    record_type_code = '8'
+
+    numeric_fields = ['serv_cls_code', 'entadd_count', 'entry_hash',
+                      'debit_amount', 'credit_amount', 'orig_dfi_id',
+                      'batch_id']
+
+    alpha_numeric_fields = ['company_id', 'mesg_auth_code', 'reserved']
+
+    field_lengths = {
+        'serv_cls_code': 3,
+        'entadd_count': 6,
+        'entry_hash': 10,
+        'debit_amount': 12,
+        'credit_amount': 12,
+        'company_id': 10,
+        'mesg_auth_code': 19,
+        'reserved': 6,
+        'orig_dfi_id': 8,
+        'batch_id': 7,
+    }
+
+    __slots__ = tuple(field_lengths)
+
+    # Created empty by the builder, then filled in by assignment
+    optional_fields = numeric_fields + alpha_numeric_fields
+
+    row_fields = (
+        'record_type_code', 'serv_cls_code', 'entadd_count', 'entry_hash',
+        'debit_amount', 'credit_amount', 'company_id', 'mesg_auth_code',
+        'reserved', 'orig_dfi_id', 'batch_id',
+    )
+
+    def __init__(self, serv_cls_code='220', entadd_count='', entry_hash='',
+                 debit_amount='', credit_amount='', company_id='',
+                 orig_dfi_id='', batch_id='', mesg_auth_code=''):
+        """
+        Initializes and validates the batch control record
+        """
+        fields = locals().copy()
+        del fields['self']
+        fields['reserved'] = ''
+
+        for key in ('debit_amount', 'credit_amount'):
+            if fields[key] != '':
+                fields[key] = int(100 * fields[key])
+
+        self.load(fields)
+
+
+class EntryDetail(Ach):
+    """
+    Object represents a single Entry Detail record of an ACH file
+    """
+
+    record_type_code = '6'
+
+    std_ent_cls_code_list = STD_ENT_CLS_CODES
+
+    numeric_fields = ['transaction_code', 'recv_dfi_id', 'check_digit',
+                      'amount', 'num_add_recs', 'card_exp_date', 'doc_ref_num',
+                      'ind_card_acct_num', 'card_tr_typ_code_shr',
+                      'add_rec_ind', 'trace_num']
+
+    alpha_numeric_fields = ['dfi_acnt_num', 'chk_serial_num', 'ind_name',
+                            'disc_data', 'id_number', 'recv_cmpy_name',
+                            'terminal_city', 'terminal_state', 'reserved',
+                            'card_tr_typ_code_pos', 'pmt_type_code']
+
+    field_lengths = {
+        'transaction_code'      : 2,
+        'recv_dfi_id'           : [8, 9],
+        'check_digit'           : 1,
+        'dfi_acnt_num'          : 17,
+        'amount'                : 10,
+        'chk_serial_num'        : [9, #POP
+                                    15,], #ARC, BOC
+        'ind_name'              : [15, #CIE, MTE
+                                    22,], #ARC, BOC, CCD, PPD, TEL, POP, POS, WEB
+        'disc_data'             : 2,
+        'id_number'             : 15,
+        'ind_id'                : 22,
+        'num_add_recs'          : 4,
+        'recv_cmpy_name'        : 16,
+        'reserved'              : 2,
+        'terminal_city'         : 4,
+        'terminal_state'        : 2,
+        'card_tr_typ_code_pos'  : 2,
+        'card_tr_typ_code_shr'  : 2,
+        'card_exp_date'         : 4,
+        'doc_ref_num'           : 11,
+        'ind_card_acct_num'     : 22,
+        'pmt_type_code'         : 2,
+        'add_rec_ind'           : 1,
+        'trace_num'             : 15,
+    }
+
+    __slots__ = tuple(field_lengths) + ('std_ent_cls_code',)
+
+    # The routing, account, amount, name and trace number of an entry are
+    # required, ind_name only for the SEC codes that have it
+    optional_fields = [
+        'check_digit', 'num_add_recs', 'card_exp_date', 'doc_ref_num',
+        'ind_card_acct_num', 'card_tr_typ_code_shr', 'add_rec_ind',
+        'chk_serial_num', 'disc_data', 'id_number', 'recv_cmpy_name',
+        'terminal_city', 'terminal_state', 'reserved', 'card_tr_typ_code_pos',
+        'pmt_type_code',
+    ]
+
+    # Fields between the amount and the addenda record indicator, by SEC code
+    sec_row_fields = {
+        'ARC': ('chk_serial_num', 'ind_name', 'disc_data'),
+        'BOC': ('chk_serial_num', 'ind_name', 'disc_data'),
+        'CCD': ('id_number', 'ind_name', 'disc_data'),
+        'PPD': ('id_number', 'ind_name', 'disc_data'),
+        'TEL': ('id_number', 'ind_name', 'disc_data'),
+        'CIE': ('ind_name', 'ind_id', 'disc_data'),
+        'CTX': ('id_number', 'num_add_recs', 'recv_cmpy_name', 'reserved',
+                'disc_data'),
+        'MTE': ('ind_name', 'ind_id', 'disc_data'),
+        'POP': ('chk_serial_num', 'terminal_city', 'terminal_state',
+                'ind_name', 'disc_data'),
+        'POS': ('id_number', 'ind_name', 'card_tr_typ_code_pos'),
+        'SHR': ('card_exp_date', 'doc_ref_num', 'ind_card_acct_num',
+                'card_tr_typ_code_shr'),
+        'RCK': ('chk_serial_num', 'ind_name', 'disc_data'),
+        'WEB': ('id_number', 'ind_name', 'pmt_type_code'),
+    }
+
+    # Row getters by SEC code and presence of the check digit, that is
+    # only written after 8 digits routing numbers
+    row_getters = {
+        (sec, check_digit): attrgetter(
+            'record_type_code', 'transaction_code', 'recv_dfi_id',
+            *(('check_digit',) if check_digit else ()),
+            'dfi_acnt_num', 'amount', *fields, 'add_rec_ind', 'trace_num'
+        )
+        for sec, fields in sec_row_fields.items()
+        for check_digit in (True, False)
+    }
+
+    @classmethod
+    def compile_encoders(cls):
+        encoders = super().compile_encoders()
+
+        validate_short_routing = numeric(cls.field_lengths['recv_dfi_id'][0])
+        validate_routing = numeric(cls.field_lengths['recv_dfi_id'][1])
+        validate_short_name = alpha_numeric(cls.field_lengths['ind_name'][0])
+        validate_name = alpha_numeric(cls.field_lengths['ind_name'][1])
+
+        def recv_dfi_id(record, value):
+            try:
+                # try 8 digits first
+                return validate_short_routing(record, value)
+            except AchError:
+                # now try to validate it 9 instead
+                return validate_routing(record, value)
+
+        def ind_name(record, value):
+            # Special handling for Indvidiual/Company name field
+            if record.std_ent_cls_code in ['CIE', 'MTE']:
+                return validate_short_name(record, value)
+            return validate_name(record, value)
+
+        def std_ent_cls_code(record, value):
+            if value not in cls.std_ent_cls_code_list:
+                raise AchError(cls.unknown_field_error % 'std_ent_cls_code')
+            return value
+
+        encoders['recv_dfi_id'] = recv_dfi_id
+        encoders['ind_name'] = ind_name
+        encoders['chk_serial_num'] = alpha_numeric(
+            cls.field_lengths['chk_serial_num'][1])
+        encoders['std_ent_cls_code'] = std_ent_cls_code
+        return encoders
+
+    @classmethod
+    def compile_defaults(cls):
+        defaults = super().compile_defaults()
+        defaults['chk_serial_num'] = ' ' * cls.field_lengths['chk_serial_num'][1]
+        # The rows without ind_name get a blank one, see __init__
+        return defaults
+
+    def __init__(self, std_ent_cls_code='PPD', transaction_code='', recv_dfi_id='',
+                 check_digit='', amount='', num_add_recs='', card_exp_date='',
+                 doc_ref_num='', ind_card_acct_num='', card_tr_typ_code_shr='',
+                 card_tr_typ_code_pos='', trace_num='', dfi_acnt_num='',
+                 ind_name='', disc_data='', id_number='', recv_cmpy_name='',
+                 chk_serial_num='', terminal_city='', terminal_state='',
+                 pmt_type_code='', add_rec_ind=''):
+        """
+        Initialize and validate the values in Entry Detail record
+        """
+        fields = locals().copy()
+        del fields['self']
+        fields['reserved'] = ''
+
+        if ind_name == '' and \
+                'ind_name' not in self.sec_row_fields.get(std_ent_cls_code, ()):
+            # Not in the row, padded to the length for the SEC code
+            fields['ind_name'] = ' '
+
+        self.load(fields)
+
+    def get_row(self):
+        return ''.join(self.row_getters[
+            self.std_ent_cls_code, len(self.recv_dfi_id) < 9
+        ](self))
+
+    def calc_check_digit(self):
+
+        multipliers = [3, 7, 1, 3, 7, 1, 3, 7]
+
+        tmp_num = 0
+
+        for num, mult in zip(list(self.recv_dfi_id), multipliers):
+            tmp_num += int(num) * mult
+
+        nearest_10 = math.ceil(tmp_num / 10.0)
+
+        self.check_digit = int((nearest_10 * 10) - tmp_num)
+
+
+class AddendaRecord(Ach):
+
+    record_type_code = '7'
+    addenda_type_code = '05'
+
+    alpha_numeric_fields = [
+        'trans_desc', 'net_id_code', 'term_id_code',
+        'trans_serial_code', 'terminal_loc', 'terminal_city',
+        'terminal_state', 'ref_info_1', 'ref_info_2', 'pmt_rel_info',
+        'auth_card_exp'
+    ]
+
+    numeric_fields = [
+        'trans_date', 'trans_time', 'trace_num',
+        'ent_det_seq_num', 'add_seq_num'
+    ]
+
+    field_lengths = {
+        'trans_desc': 7,
+        'net_id_code': 3,
+        'term_id_code': 6,
+        'trans_serial_code': 6,
+        'terminal_loc': 27,
+        'terminal_city': 15,
+        'terminal_state': 2,
+        'ref_info_1': 7,
+        'ref_info_2': 3,
+        'pmt_rel_info': 80,
+        'trans_date': 4,
+        'trans_time': 6,
+        'trace_num': 15,
+        'ent_det_seq_num': 7,
+        'auth_card_exp': 6,
+        'add_seq_num': 4,
+    }
+
+    __slots__ = tuple(field_lengths) + ('std_ent_cls_code',)
+
+    # Only the fields of the SEC code are set, the others are blank or zero
+    optional_fields = numeric_fields + alpha_numeric_fields
+
+    unknown_field_error = '%s not in numeric or alpha numeric fields'
+
+    row_getters = {
+        'MTE': attrgetter(
+            'record_type_code', 'addenda_type_code', 'trans_desc',
+            'net_id_code', 'term_id_code', 'trans_serial_code', 'trans_date',
+            'trans_time', 'terminal_loc', 'terminal_city', 'terminal_state',
+            'trace_num'),
+        'POS': attrgetter(
+            'record_type_code', 'addenda_type_code', 'ref_info_1',
+            'ref_info_2', 'term_id_code', 'trans_serial_code', 'trans_date',
+            'auth_card_exp', 'terminal_loc', 'terminal_city', 'terminal_state',
+            'trace_num'),
+    }
+    row_getters['SHR'] = row_getters['POS']
+
+    row_fields = ('record_type_code', 'addenda_type_code', 'pmt_rel_info',
+                  'add_seq_num', 'ent_det_seq_num')
+
+    @classmethod
+    def compile_encoders(cls):
+        encoders = super().compile_encoders()
+        encoders['std_ent_cls_code'] = lambda record, value: value
+        return encoders
+
+    def __init__(self, std_ent_cls_code='PPD', trans_desc='', net_id_code='',
+                 term_id_code='', ref_info_1='', ref_info_2='',
+                 trans_serial_code='', trans_date='', trans_time='',
+                 terminal_loc='', terminal_city='', terminal_state='',
+                 trace_num='', auth_card_exp='', add_seq_num='',
+                 ent_det_seq_num='', pmt_rel_info=''):
+        """
+        Initializes and validates values in entry addenda rows
+        """
+
+        fields = locals().copy()
+        del fields['self']
+
+        self.load(fields)
+
+    def get_row(self):
+        return ''.join(
+            self.row_getters.get(self.std_ent_cls_code, self.row_getter)(self)
+        )
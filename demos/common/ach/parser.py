@@ -1,5 +1,7 @@
 import json
 
+import numpy as np
+
 
 class Parser(object):
     '''
@@ -244,6 +246,8 @@ class Parser(object):
             'len': 8,
         },
         {
+            # The batch number, under the name of the previous field as
+            # before, the keys of as_json() are unchanged
             'field': 'orig_dfi_id',
             'pos': 87,
             'len': 7,
@@ -449,3 +453,225 @@ class Parser(object):
                                 self.ach_lines[line_num], 'ADDENDA_RECORD_DEF'
                             )
                         )
+
+
+class ColumnarParser(object):
+    '''
+    Columnar parser for ACH files
+
+    The fixed-width records are loaded in a NumPy array of shape
+    (records, 94) and each field is sliced as a whole column, so that
+    aggregations run on arrays instead of one dict per line. Numeric fields
+    are returned as int64 arrays, other fields as fixed-width bytes arrays.
+    '''
+
+    RECORD_SIZE = 94
+
+    NUMERIC_FIELDS = [
+        'transaction_code', 'check_digit', 'amount', 'add_rec_ind',
+        'trace_num', 'batch_count', 'block_count', 'entadd_count',
+        'entry_hash', 'debit_amount', 'credit_amount', 'batch_id',
+        'add_seq_num', 'ent_det_seq_num', 'serv_cls_code',
+    ]
+
+    def __init__(self, ach_file):
+        self.records = self.to_records(ach_file)
+        self.record_types = self.records[:, 0]
+
+    @classmethod
+    def to_records(cls, ach_file):
+        '''
+        Returns the records of ach_file (str or bytes) as a uint8 array
+        of shape (records, 94)
+        '''
+        if isinstance(ach_file, str):
+            ach_file = ach_file.encode('ascii')
+
+        size = cls.RECORD_SIZE
+        data = ach_file if ach_file.endswith(b'\n') else ach_file + b'\n'
+        buf = np.frombuffer(data, dtype=np.uint8)
+
+        # Fast path, every record has the same line ending
+        for stride in (size + 1, size + 2):
+            if len(buf) % stride == 0:
+                rows = buf.reshape(-1, stride)
+                if (rows[:, -1] == ord('\n')).all() and \
+                        (stride == size + 1 or (rows[:, size] == ord('\r')).all()):
+                    return rows[:, :size]
+
+        lines = [line.ljust(size)[:size] for line in data.splitlines() if line]
+        return np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(-1, size)
+
+    def select(self, record_type):
+        return self.records[self.record_types == ord(record_type)]
+
+    def columns(self, records, definitions):
+        '''
+        Slices every field of definitions out of records
+        '''
+        data = {}
+
+        for rule in definitions:
+            field = rule['field'].strip()
+            column = np.ascontiguousarray(
+                records[:, rule['pos']:rule['pos'] + rule['len']]
+            )
+            if field in self.NUMERIC_FIELDS:
+                data[field] = self.to_int(field, column)
+            else:
+                data[field] = column.view('S%d' % rule['len']).ravel()
+
+        return data
+
+    def to_int(self, field, column):
+        digits = column.astype(np.int64) - ord('0')
+        if ((digits < 0) | (digits > 9)).any():
+            raise ValueError('%s is not numeric' % field)
+        weights = 10 ** np.arange(column.shape[1] - 1, -1, -1, dtype=np.int64)
+        return digits @ weights
+
+    def file_header(self):
+        return self.columns(
+            self.select(Parser.FILE_HEADER)[:1], Parser.FILE_HEADER_DEF
+        )
+
+    def file_control(self):
+        # Blocking filler records are all 9s as well, the control is the first one
+        return self.columns(
+            self.select(Parser.FILE_CONTROL)[:1], Parser.FILE_CONTROL_DEF
+        )
+
+    def batch_headers(self):
+        return self.columns(
+            self.select(Parser.BATCH_HEADER), Parser.BATCH_HEADER_DEF
+        )
+
+    def batch_controls(self):
+        return self.columns(
+            self.select(Parser.BATCH_CONTROL), Parser.BATCH_CONTROL_DEF
+        )
+
+    def entries(self):
+        '''
+        Entry detail columns, with the index of the batch of each entry
+        '''
+        is_batch_header = self.record_types == ord(Parser.BATCH_HEADER)
+        is_entry = self.record_types == ord(Parser.ENTRY_DETAIL)
+        batch_index = np.cumsum(is_batch_header) - 1
+
+        data = self.columns(self.records[is_entry], Parser.ENTRY_DETAIL_DEF)
+        data['batch_index'] = batch_index[is_entry]
+
+        return data
+
+    def addenda(self):
+        '''
+        Addenda record columns, with the index of the entry each belongs to
+        '''
+        is_entry = self.record_types == ord(Parser.ENTRY_DETAIL)
+        is_addenda = self.record_types == ord(Parser.ADDENDA_RECORD)
+        entry_index = np.cumsum(is_entry) - 1
+
+        data = self.columns(self.records[is_addenda], Parser.ADDENDA_RECORD_DEF)
+        data['entry_index'] = entry_index[is_addenda]
+
+        return data
+
+    def as_arrow(self):
+        '''
+        Entry detail columns as an Arrow table, requires pyarrow
+        '''
+        import pyarrow as pa
+
+        return pa.table(self.entries())
+
+
+class StreamParser(object):
+    '''
+    Incremental parser for ACH files
+
+    Reads a byte stream (file, S3 StreamingBody, socket file...) chunk by
+    chunk and yields (record_type, data) tuples in file order:
+    file_header, batch_header, entry_detail, batch_control, file_control.
+    Entry details are yielded with their addenda, in the same layout as
+    the entries of Parser. Memory use does not depend on the file size.
+    '''
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        entry = None
+        file_control_seen = False
+
+        for line in self.lines():
+            record_type = line[0]
+
+            if record_type == Parser.ADDENDA_RECORD and entry is not None:
+                entry['addenda'].append(
+                    self.parse_line(line, Parser.ADDENDA_RECORD_DEF)
+                )
+                continue
+
+            if entry is not None:
+                yield 'entry_detail', entry
+                entry = None
+
+            if record_type == Parser.ENTRY_DETAIL:
+                entry = {
+                    'entry_detail': self.parse_line(
+                        line, Parser.ENTRY_DETAIL_DEF
+                    ),
+                    'addenda': []
+                }
+            elif record_type == Parser.FILE_HEADER:
+                yield 'file_header', self.parse_line(
+                    line, Parser.FILE_HEADER_DEF
+                )
+            elif record_type == Parser.BATCH_HEADER:
+                yield 'batch_header', self.parse_line(
+                    line, Parser.BATCH_HEADER_DEF
+                )
+            elif record_type == Parser.BATCH_CONTROL:
+                yield 'batch_control', self.parse_line(
+                    line, Parser.BATCH_CONTROL_DEF
+                )
+            elif record_type == Parser.FILE_CONTROL and not file_control_seen:
+                # Blocking filler records are all 9s as well
+                file_control_seen = True
+                yield 'file_control', self.parse_line(
+                    line, Parser.FILE_CONTROL_DEF
+                )
+
+        if entry is not None:
+            yield 'entry_detail', entry
+
+    def lines(self):
+        '''
+        Yields the non empty records of the stream as str, without line ending
+        '''
+        remainder = b''
+
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                break
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+            for line in lines:
+                line = line.rstrip(b'\r')
+                if line:
+                    yield line.decode('ascii')
+
+        remainder = remainder.rstrip(b'\r')
+        if remainder:
+            yield remainder.decode('ascii')
+
+    def parse_line(self, line, definitions):
+        record_data = {}
+
+        for rule in definitions:
+            record_data[rule['field']] = line[rule['pos']:rule['pos'] + rule['len']]
+
+        return record_data
@@ -0,0 +1,261 @@
+import os
+
+from .builder import AchFile, FileBatch, FileEntry
+
+"""
+Streaming writer of ACH files
+
+The records are rendered as soon as the entries are added and written to a
+sink in fixed-size parts, only the running totals of the file and of the
+open batch are kept. The Batch Control records are written when a batch is
+ended, the File Control record and the blocking filler when the writer is
+closed. The output is the same as AchFile.render_to_string().
+
+    with AchWriter(S3MultipartSink(s3client, bucket, key), 'A', settings) as writer:
+        writer.start_batch('POS', credits=True, debits=True)
+        for record in records:
+            writer.add_entry(record)
+"""
+
+DEBIT_CODES = ['27', '37', '28', '38']
+CREDIT_CODES = ['22', '32', '23', '33']
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class LocalFileSink(object):
+    """
+    Writes the parts to a local file, removed if the writer fails
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+class S3MultipartSink(object):
+    """
+    Uploads the parts to an object with a multipart upload, started with the
+    first full part. A file smaller than part_size is sent with put_object.
+    """
+
+    def __init__(self, s3client, bucket, key, part_size=8 * 1024 * 1024):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError('part_size must be at least {} bytes'.format(MIN_PART_SIZE))
+        self.s3client = s3client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+
+    def upload_part(self, body):
+        if self.upload_id is None:
+            response = self.s3client.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+            self.upload_id = response['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3client.upload_part(Bucket=self.bucket, Key=self.key,
+                                             UploadId=self.upload_id,
+                                             PartNumber=part_number, Body=body)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def close(self):
+        if self.upload_id is None:
+            self.s3client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                # The last part can be smaller than the minimum
+                self.upload_part(bytes(self.buffer))
+            self.s3client.complete_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                    UploadId=self.upload_id,
+                                                    MultipartUpload={'Parts': self.parts})
+        self.buffer = bytearray()
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3client.abort_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                 UploadId=self.upload_id)
+        self.buffer = bytearray()
+
+
+class StreamBatch(object):
+    """
+    Running totals of the open batch of a writer
+    """
+
+    def __init__(self, batch_header):
+        self.batch_header = batch_header
+        self.entry_counter = 0
+        self.entadd_count = 0
+        self.entry_hash = 0
+        self.debit_amount = 0
+        self.credit_amount = 0
+
+    def add(self, entry_detail, addenda_count):
+        self.entadd_count += 1 + addenda_count
+        self.entry_hash += int(entry_detail.recv_dfi_id[:8])
+        transaction_code = str(entry_detail.transaction_code)
+        if transaction_code in DEBIT_CODES:
+            self.debit_amount += int(entry_detail.amount)
+        elif transaction_code in CREDIT_CODES:
+            self.credit_amount += int(entry_detail.amount)
+
+
+class AchWriter(object):
+    """
+    Writes an ACH file to a sink while its entries are added. Its main
+    methods are `start_batch`, `add_entry` and `close`.
+    """
+
+    def __init__(self, sink, file_id_mod, settings, force_crlf=False,
+                 buffer_size=256 * 1024):
+        """
+        args: sink (LocalFileSink or S3MultipartSink), file_id_mod and
+        settings as for AchFile
+        """
+        self.sink = sink
+        self.line_ending = '\r\n' if force_crlf else '\n'
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.pending = 0
+        self.batch = None
+        self.closed = False
+
+        # Holds the header and the running totals of the file, no batch
+        self.ach_file = AchFile(file_id_mod, settings)
+        self.write(self.ach_file.header.get_row() + self.line_ending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, line):
+        self.lines.append(line)
+        self.pending += len(line)
+        if self.pending >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.sink.write(''.join(self.lines).encode('ascii'))
+            self.lines = []
+            self.pending = 0
+
+    def start_batch(self, std_ent_cls_code, credits=True, debits=False,
+                    eff_ent_date=None, company_id=None):
+        """
+        Ends the open batch, if any, and writes the header of a new one
+        """
+        self.end_batch()
+        batch_header = self.ach_file.create_batch_header(
+            std_ent_cls_code, credits, debits, eff_ent_date, company_id)
+        self.batch = StreamBatch(batch_header)
+        self.write(batch_header.get_row() + self.line_ending)
+
+    def add_entry(self, record):
+        """
+        Writes an entry of the open batch, record is a dict as in the
+        batch_entries of AchFile.add_batch
+        """
+        if self.batch is None:
+            raise Exception('start_batch must be called before add_entry')
+
+        self.batch.entry_counter += 1
+        entry = FileEntry(
+            self.ach_file.create_entry(self.batch.batch_header.std_ent_cls_code,
+                                       record, self.batch.entry_counter),
+            record.get('addenda', [])
+        )
+        self.batch.add(entry.entry_detail, len(entry.addenda_record))
+
+        self.write(entry.entry_detail.get_row() + self.line_ending)
+        for addenda in entry.addenda_record:
+            self.write(addenda.get_row() + self.line_ending)
+
+    def add_rendered_entries(self, rows, count, entry_hash, debit_amount,
+                             credit_amount):
+        """
+        Writes count Entry Detail records of the open batch already rendered
+        as bytes, with their line endings, and adds their totals to the
+        batch. Their trace numbers must follow the entries already written.
+        """
+        if self.batch is None:
+            raise Exception('start_batch must be called before add_rendered_entries')
+
+        self.flush()
+        self.sink.write(rows)
+        self.batch.entry_counter += count
+        self.batch.entadd_count += count
+        self.batch.entry_hash += entry_hash
+        self.batch.debit_amount += debit_amount
+        self.batch.credit_amount += credit_amount
+
+    def add_batch(self, std_ent_cls_code, batch_entries=None,
+                  credits=True, debits=False, eff_ent_date=None,
+                  company_id=None):
+        """
+        Same as AchFile.add_batch, batch_entries can be any iterable
+        """
+        self.start_batch(std_ent_cls_code, credits, debits, eff_ent_date, company_id)
+        for record in batch_entries or []:
+            self.add_entry(record)
+        self.end_batch()
+
+    def end_batch(self):
+        """
+        Writes the Batch Control record of the open batch
+        """
+        if self.batch is None:
+            return
+        batch, self.batch = self.batch, None
+
+        batch.entry_hash = int(str(batch.entry_hash)[-10:])
+        self.write(FileBatch.create_control(batch.batch_header, batch).get_row()
+                   + self.line_ending)
+        self.ach_file.add_totals(batch)
+
+    def close(self):
+        """
+        Writes the File Control record and the blocking filler, then
+        completes the sink
+        """
+        if self.closed:
+            return
+        self.end_batch()
+        for line in self.ach_file.iter_control_lines(self.line_ending):
+            self.write(line)
+        self.flush()
+        self.sink.close()
+        self.closed = True
+
+    def abort(self):
+        """
+        Discards what was written to the sink
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.lines = []
+        self.sink.abort()
@@ -0,0 +1,264 @@
+import json
+import logging
+import signal
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from kafka import KafkaConsumer, KafkaProducer
+    from kafka.structs import OffsetAndMetadata, TopicPartition
+except ImportError:
+    KafkaConsumer = None
+    KafkaProducer = None
+    OffsetAndMetadata = namedtuple('OffsetAndMetadata', ['offset', 'metadata'])
+    TopicPartition = namedtuple('TopicPartition', ['topic', 'partition'])
+
+"""
+Kafka consumer entry point, an alternative to the KafkaSource HTTP sink
+
+Messages are polled in batches and the records of a batch are handed to the
+service handler in one call. Up to max_in_flight batches are processed at
+the same time, and the offsets are committed in poll order once a batch and
+all the batches before it were processed. The records that failed are
+handed again to the handler, up to max_attempts times, then published to a
+dead-letter topic and the batch is committed. When that publication fails,
+the partitions are rewound so that the batch is delivered again
+(at-least-once).
+"""
+
+
+def decode_records(value):
+    """Returns the records of a message, either a bucket notification or a single record"""
+    data = json.loads(value)
+    if isinstance(data, dict) and 'Records' in data:
+        return data['Records']
+    return [data]
+
+
+def record_name(record):
+    """Returns bucket/key for a bucket notification record, the key of the processing reports"""
+    try:
+        return record['s3']['bucket']['name'] + '/' + record['s3']['object']['key']
+    except (KeyError, TypeError):
+        return None
+
+
+class DeadLetters:
+    """Publishes the records given up on to a topic, with their error"""
+
+    def __init__(self, producer, topic, timeout=10):
+        self.producer = producer
+        self.topic = topic
+        self.timeout = timeout
+
+    def __call__(self, records, errors):
+        futures = [self.producer.send(self.topic, json.dumps({
+            'record': record,
+            'error': errors.get(record_name(record), errors.get(None)),
+        }).encode('utf-8')) for record in records]
+        self.producer.flush(self.timeout)
+        for future in futures:
+            future.get(timeout=self.timeout)
+
+
+class Batch:
+    def __init__(self, polled, future):
+        self.future = future
+        # First offset and next offset to commit of each partition
+        self.first = {tp: messages[0].offset for tp, messages in polled.items()}
+        self.offsets = {tp: messages[-1].offset + 1 for tp, messages in polled.items()}
+
+
+class ConsumerLoop:
+    """Polls a consumer and processes its messages until stop()"""
+
+    def __init__(self, consumer, handler, decode=decode_records, max_poll_records=100,
+                 poll_timeout_ms=1000, max_in_flight=2, retry_backoff_ms=1000,
+                 max_attempts=3, dead_letter=None):
+        """
+        :param handler: called with the list of records of a batch, it raises
+            when they all failed or returns a report whose 'failed' entries
+            are keyed by record_name()
+        :param decode: returns the list of records of a message value
+        :param max_attempts: calls of the handler for a record before it is
+            given up on
+        :param dead_letter: called with the records given up on and their
+            errors by name, they are only logged when it is None
+        """
+        self.consumer = consumer
+        self.handler = handler
+        self.decode = decode
+        self.max_poll_records = max_poll_records
+        self.poll_timeout_ms = poll_timeout_ms
+        self.max_in_flight = max_in_flight
+        self.retry_backoff_ms = retry_backoff_ms
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter = dead_letter
+        self.running = False
+        self.metrics = {'messages': 0, 'records': 0, 'batches': 0, 'commits': 0,
+                        'failed_batches': 0, 'invalid_messages': 0, 'retries': 0,
+                        'dead_letters': 0}
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.running = True
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while self.running:
+                polled = self.consumer.poll(timeout_ms=self.poll_timeout_ms,
+                                            max_records=self.max_poll_records)
+                if polled:
+                    messages = [message for tp in polled for message in polled[tp]]
+                    pending.append(Batch(polled, executor.submit(self.process, messages)))
+
+                if len(pending) >= self.max_in_flight:
+                    wait([pending[0].future])
+                self.complete(pending)
+
+            # Let the batches in progress finish and commit them
+            wait([batch.future for batch in pending])
+            self.complete(pending)
+
+    def process(self, messages):
+        """Returns True when the batch can be committed"""
+        records = []
+        for message in messages:
+            try:
+                records.extend(self.decode(message.value))
+            except Exception as e:
+                # Delivering it again would not help, the message is skipped
+                logging.error(f"Invalid message at offset {message.offset}: {e}")
+                self.metrics['invalid_messages'] += 1
+        self.metrics['messages'] += len(messages)
+        self.metrics['records'] += len(records)
+
+        # Only the records that failed are handed again to the handler
+        pending = records
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                self.metrics['retries'] += 1
+                time.sleep(self.retry_backoff_ms / 1000)
+            pending, errors = self.attempt(pending)
+            if not pending:
+                break
+            logging.error('{} record(s) failed, attempt {}/{}: {}'.format(
+                len(pending), attempt, self.max_attempts, errors))
+        else:
+            if not self.give_up(pending, errors):
+                return False
+
+        self.metrics['batches'] += 1
+        return True
+
+    def attempt(self, records):
+        """Returns the records that failed and their errors by name"""
+        if not records:
+            return [], {}
+        try:
+            report = self.handler(records)
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            return records, {None: str(e)}
+        failed = (report or {}).get('failed')
+        if not failed:
+            return [], {}
+        retried = [record for record in records if record_name(record) in failed]
+        # A report the records cannot be matched to fails all of them
+        return retried or records, failed
+
+    def give_up(self, records, errors):
+        """Publishes the records to the dead letters, returns False when it failed"""
+        if self.dead_letter is None:
+            for record in records:
+                logging.error('record dropped after {} attempts: {}'.format(
+                    self.max_attempts, json.dumps(record)))
+        else:
+            try:
+                self.dead_letter(records, errors)
+            except Exception as e:
+                logging.error(f"Dead letter publication failed: {e}")
+                return False
+        self.metrics['dead_letters'] += len(records)
+        return True
+
+    def complete(self, pending):
+        """Commits the batches processed, in poll order, up to the first one still running"""
+        while pending and pending[0].future.done():
+            batch = pending.popleft()
+            if not batch.future.result():
+                self.rewind(batch, pending)
+                return
+            try:
+                self.consumer.commit({tp: OffsetAndMetadata(offset, '')
+                                      for tp, offset in batch.offsets.items()})
+                self.metrics['commits'] += 1
+            except Exception as e:
+                # The partitions were reassigned, the new owner processes them again
+                logging.error(f"Commit failed: {e}")
+
+    def rewind(self, failed, pending):
+        """
+        Seeks back to the batch that could not be committed, the batches
+        polled after it are delivered again too
+        """
+        self.metrics['failed_batches'] += 1
+        for batch in pending:
+            batch.future.cancel()
+        wait([batch.future for batch in pending])
+
+        positions = dict(failed.first)
+        for batch in pending:
+            for tp, offset in batch.first.items():
+                positions[tp] = min(offset, positions.get(tp, offset))
+        pending.clear()
+
+        for tp, offset in positions.items():
+            self.consumer.seek(tp, offset)
+        time.sleep(self.retry_backoff_ms / 1000)
+
+
+def consume(handler, topic, bootstrap_servers, group_id, decode=decode_records,
+            max_poll_records=100, max_in_flight=2, max_attempts=3,
+            dead_letter_topic=None, on_shutdown=None):
+    """
+    Consumes topic with handler until SIGTERM, in place of the HTTP receiver
+    :param bootstrap_servers: comma-separated host:port list
+    :param dead_letter_topic: topic of the records that still failed after
+        max_attempts, they are only logged when it is empty
+    :param on_shutdown: callables run before exiting
+    """
+    if KafkaConsumer is None:
+        raise Exception('kafka-python is required to consume from Kafka')
+
+    consumer = KafkaConsumer(topic,
+                             bootstrap_servers=bootstrap_servers.split(','),
+                             group_id=group_id,
+                             enable_auto_commit=False,
+                             auto_offset_reset='earliest',
+                             max_poll_records=max_poll_records)
+    producer = None
+    dead_letter = None
+    if dead_letter_topic:
+        producer = KafkaProducer(bootstrap_servers=bootstrap_servers.split(','), acks='all')
+        dead_letter = DeadLetters(producer, dead_letter_topic)
+    loop = ConsumerLoop(consumer, handler, decode, max_poll_records=max_poll_records,
+                        max_in_flight=max_in_flight, max_attempts=max_attempts,
+                        dead_letter=dead_letter)
+    signal.signal(signal.SIGTERM, lambda signum, frame: loop.stop())
+
+    logging.info("consuming {} as {}, {} batches in flight".format(topic, group_id, max_in_flight))
+    try:
+        loop.run()
+    finally:
+        consumer.close(autocommit=False)
+        if producer is not None:
+            producer.close()
+        for hook in on_shutdown or []:
+            try:
+                hook()
+            except Exception as e:
+                logging.error(f"Shutdown hook error: {e}")
+    logging.info('consumer stopped: {}'.format(loop.metrics))
@@ -0,0 +1,267 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from mysql.connector import errors, pooling
+
+DatabaseError = errors.Error
+RETRYABLE_ERRORS = (errors.InterfaceError, errors.OperationalError)
+
+"""
+Pooled connections to the helper database
+
+Connections are kept open in a per-process pool and reused by every
+statement, instead of paying a TCP connection and authentication
+handshake for each INSERT. Statements are sent as prepared statements
+with their values passed as parameters.
+
+use() replaces the pool with another one with the same interface.
+"""
+
+config = None
+pool = None
+pool_pid = None
+pool_slots = None
+lock = threading.Lock()
+
+
+def configure(user, password, host, database, pool_size=5):
+    """
+    Sets the connection parameters, the pool is created on first use
+    """
+    global config, pool
+
+    pool = None
+    config = {
+        'user': user,
+        'password': password,
+        'host': host,
+        'database': database,
+        'pool_size': pool_size,
+        'pool_reset_session': False,
+    }
+
+
+def use(new_pool, pool_size=1):
+    """
+    Replaces the pool of the process, with at most pool_size connections
+    in use at a time
+    """
+    global config, pool, pool_pid, pool_slots
+
+    config = {'pool_size': pool_size}
+    pool = new_pool
+    pool_pid = os.getpid()
+    pool_slots = threading.BoundedSemaphore(pool_size)
+
+
+def get_pool():
+    """
+    Returns the pool of the current process. A forked child gets its own
+    pool, it must not share the sockets of its parent.
+    """
+    global pool, pool_pid, pool_slots
+
+    if config is None:
+        raise Exception('helper_db.configure() must be called first')
+
+    pid = os.getpid()
+    if pool is None or pool_pid != pid:
+        with lock:
+            if pool is None or pool_pid != pid:
+                pool = pooling.MySQLConnectionPool(
+                    pool_name='helper_db_{}'.format(pid), **config)
+                pool_slots = threading.BoundedSemaphore(config['pool_size'])
+                pool_pid = pid
+                logging.info('helper database pool created, size {}'.format(
+                    config['pool_size']))
+
+    return pool
+
+
+def execute(query, params=(), retries=1):
+    """
+    Runs a parameterized statement on a pooled connection and commits it.
+    If the server dropped the connection, the statement is retried on a
+    reconnected one.
+    """
+    run(lambda cursor: cursor.execute(query, params), retries)
+
+
+def executemany(query, rows, retries=1):
+    """
+    Runs a parameterized statement for each row in a single transaction
+    """
+    run(lambda cursor: cursor.executemany(query, rows), retries)
+
+
+def run(statements, retries=1, prepared=True):
+    """
+    Calls statements(cursor) on a pooled connection and commits. Waits for
+    a free connection when all of them are in use.
+    """
+    current_pool = get_pool()
+
+    for attempt in range(retries + 1):
+        with pool_slots:
+            # The pool reconnects connections that were dropped
+            cnx = current_pool.get_connection()
+            try:
+                cursor = cnx.cursor(prepared=prepared)
+                try:
+                    result = statements(cursor)
+                    cnx.commit()
+                    return result
+                finally:
+                    cursor.close()
+            except Exception as e:
+                # The session is not reset by the pool, a failed transaction
+                # must not be committed by the next user of the connection
+                rollback(cnx)
+                if attempt == retries or not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                logging.warning('Helper database error, retrying: {}'.format(e))
+            finally:
+                cnx.close()  # Returns the connection to the pool
+
+
+def rollback(cnx):
+    try:
+        cnx.rollback()
+    except DatabaseError:
+        pass  # The connection is gone, and the transaction with it
+
+
+class MetricsWriter(object):
+    """
+    Buffers helper database rows and writes them in the background
+
+    record() only queues the row with its timestamp, so the request does not
+    wait for the database. A writer thread flushes the queued rows every
+    flush_rows rows or flush_interval_ms, with one multi-row INSERT per
+    table. The queue holds at most max_queue rows, record() waits when it
+    is full. Pending rows are flushed when the process exits.
+
+    The rows of a failed INSERT are kept and written with the next flush.
+    At most max_queue rows are kept this way, the oldest ones are dropped
+    beyond that and counted in metrics['metrics_rows_dropped'].
+    """
+
+    def __init__(self, flush_rows=100, flush_interval_ms=1000, max_queue=10000):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_queue = max_queue
+        self.pid = None
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.metrics = {'metrics_rows_written': 0, 'metrics_rows_dropped': 0,
+                        'metrics_write_failures': 0}
+        atexit.register(self.close)
+
+    def start(self):
+        # Threads do not survive a fork, each process starts its own writer
+        # and must not write the rows queued by its parent
+        pid = os.getpid()
+        if self.pid != pid:
+            with self.lock:
+                if self.pid != pid:
+                    self.queue = queue.Queue(self.max_queue)
+                    self.retry = deque()
+                    self.wakeup = threading.Event()
+                    self.stopped = False
+                    self.thread = threading.Thread(
+                        target=self.run, name='metrics-writer', daemon=True)
+                    self.thread.start()
+                    self.pid = pid
+
+    def record(self, table, **columns):
+        """
+        Queues one row of table, its time column is set to now in UTC, like
+        the CURRENT_TIMESTAMP() of the rows inserted directly
+        """
+        self.start()
+        self.queue.put((table, tuple(sorted(columns)), datetime.utcnow(),
+                        tuple(columns[name] for name in sorted(columns))))
+        if self.queue.qsize() >= self.flush_rows:
+            self.wakeup.set()
+
+    def run(self):
+        while not self.stopped:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all the queued rows now
+        """
+        if self.pid != os.getpid():
+            return
+
+        with self.flush_lock:
+            # The rows of the failed INSERTs first, they are the oldest
+            items = list(self.retry)
+            self.retry.clear()
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            tables = {}
+            for item in items:
+                tables.setdefault(item[:2], []).append(item)
+
+            for (table, names), table_items in tables.items():
+                query = 'INSERT INTO {}(time{}) VALUES (%s{})'.format(
+                    table, ''.join(',' + name for name in names),
+                    ', %s' * len(names))
+                rows = [(timestamp,) + values for _, _, timestamp, values in table_items]
+                start = time.perf_counter()
+                try:
+                    # A plain cursor turns executemany into a multi-row INSERT
+                    run(lambda cursor: cursor.executemany(query, rows),
+                        prepared=False)
+                except Exception as e:
+                    logging.error('Failed to write {} rows to {}, kept for the next flush: {}'.format(
+                        len(rows), table, e))
+                    self.metrics['metrics_write_failures'] += 1
+                    self.keep(table_items)
+                    continue
+                self.metrics['metrics_rows_written'] += len(rows)
+                logging.info('{} rows written to {} in {:.3f}s'.format(
+                    len(rows), table, time.perf_counter() - start))
+
+    def keep(self, items):
+        """
+        Keeps the rows of a failed INSERT for the next flush, dropping the
+        oldest rows kept beyond max_queue
+        """
+        self.retry.extend(items)
+        dropped = 0
+        while len(self.retry) > self.max_queue:
+            self.retry.popleft()
+            dropped += 1
+        if dropped:
+            self.metrics['metrics_rows_dropped'] += dropped
+            logging.error('{} metrics rows dropped'.format(dropped))
+
+    def close(self):
+        """
+        Stops the writer thread and flushes the pending rows
+        """
+        if self.pid != os.getpid():
+            return
+        self.stopped = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        if self.retry:
+            self.metrics['metrics_rows_dropped'] += len(self.retry)
+            logging.error('{} metrics rows not written at exit'.format(len(self.retry)))
+            self.retry.clear()
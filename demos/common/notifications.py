@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+import storage
+
+"""
+Decoding of the S3 bucket notifications carried by the CloudEvents
+
+The body is parsed as JSON (with orjson when it is installed) and only the
+fields used by the services are checked and kept, for every record of the
+notification.
+"""
+
+
+class NotificationError(Exception):
+    pass
+
+
+def decode(body):
+    """
+    Returns the records of a notification body (bytes or str), each reduced
+    to its eventName, bucket name and object key
+    """
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise NotificationError('notification is not valid JSON: {}'.format(e))
+
+    records = data.get('Records') if isinstance(data, dict) else None
+    if not isinstance(records, list) or not records:
+        raise NotificationError('notification has no Records')
+
+    return [validate(record) for record in records]
+
+
+def validate(record):
+    try:
+        event_name = record['eventName']
+        bucket_name = record['s3']['bucket']['name']
+        object_key = record['s3']['object']['key']
+    except (KeyError, TypeError) as e:
+        raise NotificationError('record is missing {}'.format(e))
+
+    for value in (event_name, bucket_name, object_key):
+        if not isinstance(value, str):
+            raise NotificationError('record field {!r} is not a string'.format(value))
+
+    return {
+        'eventName': event_name,
+        's3': {
+            'bucket': {'name': bucket_name},
+            'object': {'key': object_key},
+        },
+    }
+
+
+def object_name(record):
+    return record['s3']['bucket']['name'] + '/' + record['s3']['object']['key']
+
+
+def process_batch(records, func, concurrency=4):
+    """
+    Calls func(record) for all the records of a notification concurrently.
+    Returns a report with the result of func for each processed object, and
+    the error of each object that failed. A failure does not stop the
+    processing of the other records.
+
+    When a record fails, the whole notification is delivered again, func
+    must skip the records it already processed. An object that does not
+    exist anymore was deleted once processed, by an earlier delivery of the
+    record: it is reported processed with a None result.
+    """
+    report = {'processed': {}, 'failed': {}}
+    if not records:
+        return report
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(records))) as executor:
+        futures = [(record, executor.submit(func, record)) for record in records]
+        for record, future in futures:
+            try:
+                report['processed'][object_name(record)] = future.result()
+            except Exception as e:
+                if storage.is_missing(e):
+                    logging.warning('{} already processed'.format(object_name(record)))
+                    report['processed'][object_name(record)] = None
+                else:
+                    report['failed'][object_name(record)] = str(e)
+
+    logging.info('{} record(s) processed, {} failed in {:.3f}s'.format(
+        len(report['processed']), len(report['failed']), time.perf_counter() - start))
+    return report
@@ -0,0 +1,309 @@
+import http.server
+import json
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Serving modes for the CloudEvents receivers
+
+* fork: one process is forked for each request, nothing is kept between
+  requests
+* thread: a single process handles the requests with a fixed pool of
+  threads, clients, database pools and models stay warm
+* prefork: a fixed number of worker processes are forked at startup and
+  accept connections on the same socket, each keeps its own warm state
+
+In every mode SIGTERM stops accepting new connections, lets the requests
+in progress finish, then runs the shutdown hooks before exiting.
+
+Nothing is created when a service module is imported: its application
+factory returns a receiver with a Readiness, whose warm-up steps create
+the clients and load the models. GET /ready answers 503 until they are
+done, then 200 with the startup time. The warm-up runs while the server
+already answers the probes: in thread mode in the serving process, in
+prefork mode in each worker once forked, as the clients, the model and the
+background threads must not be created before a fork. In fork mode there
+is no warm-up, each request process creates what it uses. GET /live
+always answers 200.
+"""
+
+MODES = ['fork', 'thread', 'prefork']
+
+# Fallback for process_start_time()
+IMPORTED = time.time()
+
+
+def process_start_time():
+    """
+    Returns the wall clock time the process started at, read from /proc on
+    Linux, else the time this module was imported
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # starttime, the 22nd field, in clock ticks after boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return IMPORTED
+
+
+class Readiness(object):
+    """
+    Warm-up steps of a service and their timings. A failed step is logged
+    and retried every retry_interval seconds, the service stays not ready.
+    """
+
+    def __init__(self, steps, retry_interval=5):
+        """
+        :param steps: list of (name, callable) run in order
+        """
+        self.steps = steps
+        self.retry_interval = retry_interval
+        self.ready = threading.Event()
+        self.thread = None
+        self.error = None
+        self.timings = {}
+        self.process_start = process_start_time()
+        # Interpreter startup and imports, until the application is created
+        self.init_seconds = time.time() - self.process_start
+        self.startup_seconds = None
+
+    def warm(self):
+        """
+        Runs the steps, returns once they all succeeded
+        """
+        for name, step in self.steps:
+            while True:
+                start = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    self.error = '{}: {}'.format(name, e)
+                    logging.error('warm-up of {} failed, retrying in {}s: {}'.format(
+                        name, self.retry_interval, e))
+                    time.sleep(self.retry_interval)
+                    continue
+                self.timings[name] = round(time.perf_counter() - start, 3)
+                break
+
+        self.error = None
+        self.startup_seconds = time.time() - self.process_start
+        self.ready.set()
+        logging.info('ready {:.3f}s after process start: init {:.3f}s, {}'.format(
+            self.startup_seconds, self.init_seconds,
+            ', '.join('{} {:.3f}s'.format(name, seconds) for name, seconds in self.timings.items())))
+
+    def skip(self):
+        """
+        Marks the service ready without running the steps
+        """
+        self.startup_seconds = time.time() - self.process_start
+        self.ready.set()
+        logging.info('warm-up skipped, the steps run in each request process')
+
+    def start(self):
+        """
+        Runs the warm-up in a background thread
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.warm, name='warm-up', daemon=True)
+            self.thread.start()
+
+    def status(self):
+        status = {
+            'ready': self.ready.is_set(),
+            'init_seconds': round(self.init_seconds, 3),
+            'warmup_seconds': dict(self.timings),
+        }
+        if self.startup_seconds is not None:
+            status['startup_seconds'] = round(self.startup_seconds, 3)
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+class ProbeHandler(http.server.BaseHTTPRequestHandler):
+    """Answer the liveness and readiness probes."""
+
+    readiness = None
+
+    def do_GET(self):
+        if self.path == '/live':
+            self.send_json(200, {'live': True})
+        elif self.path == '/ready':
+            if self.readiness is None:
+                self.send_json(200, {'ready': True})
+            else:
+                status = self.readiness.status()
+                self.send_json(200 if status['ready'] else 503, status)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def send_json(self, code, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ForkedHTTPServer(socketserver.ForkingMixIn, http.server.HTTPServer):
+    """Handle requests with fork."""
+
+    on_shutdown = []
+
+    def finish_request(self, request, client_address):
+        super().finish_request(request, client_address)
+        # The forked child exits right after the request
+        if os.getpid() != self.parent_pid:
+            run_hooks(self.on_shutdown)
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """Handle requests with a fixed pool of threads."""
+
+    workers = 4
+
+    def server_activate(self):
+        super().server_activate()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        # Waits for the requests in progress
+        self.executor.shutdown(wait=True)
+
+
+class PreforkWorkerHTTPServer(http.server.HTTPServer):
+    """Handle requests one at a time in a pre-forked worker."""
+
+    def get_request(self):
+        # The listening socket is non-blocking so that workers do not block
+        # in accept() when another worker took the connection
+        request, client_address = self.socket.accept()
+        request.setblocking(True)
+        return request, client_address
+
+
+def run_hooks(hooks):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logging.error(f"Shutdown hook error: {e}")
+
+
+def stop_on_sigterm(httpd):
+    # shutdown() waits for serve_forever() to return, it cannot be called
+    # from the signal handler which runs in the serving thread
+    def handler(signum, frame):
+        logging.info('SIGTERM received, draining')
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, handler)
+
+
+def serve(port, handler_class, mode='thread', workers=4, on_shutdown=None,
+          readiness=None):
+    """
+    Serves handler_class on port until SIGTERM
+    :param mode: one of MODES
+    :param workers: number of threads (thread) or processes (prefork)
+    :param on_shutdown: callables run before a serving process exits
+    :param readiness: Readiness warmed up before the service is ready, its
+    status is served by handler_class if it is a ProbeHandler
+    """
+    if mode not in MODES:
+        raise Exception('serving mode must be one of {}'.format(MODES))
+    on_shutdown = on_shutdown or []
+    handler_class.readiness = readiness
+    if readiness is not None and mode == 'fork':
+        # Nothing is kept between requests, and a process that loaded a
+        # model or started threads must not fork
+        readiness.skip()
+
+    socketserver.TCPServer.allow_reuse_address = True
+    logging.info("serving at port {} in {} mode".format(port, mode))
+
+    if mode == 'fork':
+        ForkedHTTPServer.on_shutdown = on_shutdown
+        with ForkedHTTPServer(("", port), handler_class) as httpd:
+            httpd.parent_pid = os.getpid()
+            stop_on_sigterm(httpd)
+            httpd.serve_forever()
+
+    elif mode == 'thread':
+        PooledHTTPServer.workers = workers
+        with PooledHTTPServer(("", port), handler_class) as httpd:
+            stop_on_sigterm(httpd)
+            if readiness is not None:
+                readiness.start()
+            httpd.serve_forever()
+            httpd.drain()
+        run_hooks(on_shutdown)
+
+    else:
+        with PreforkWorkerHTTPServer(("", port), handler_class) as httpd:
+            httpd.socket.setblocking(False)
+            serve_prefork(httpd, workers, on_shutdown, readiness)
+
+    logging.info('server stopped')
+
+
+def serve_prefork(httpd, workers, on_shutdown, readiness=None):
+    children = set()
+    terminating = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                stop_on_sigterm(httpd)
+                # Each worker warms up its own clients, model and threads
+                if readiness is not None:
+                    readiness.start()
+                httpd.serve_forever()
+                run_hooks(on_shutdown)
+            except BaseException:
+                logging.exception('worker error')
+                status = 1
+            finally:
+                os._exit(status)
+        children.add(pid)
+
+    def handler(signum, frame):
+        nonlocal terminating
+        logging.info('SIGTERM received, stopping {} workers'.format(len(children)))
+        terminating = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, handler)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        if not terminating:
+            logging.error('worker {} exited with status {}, restarting'.format(pid, status))
+            spawn()
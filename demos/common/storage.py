@@ -0,0 +1,69 @@
+import logging
+import threading
+
+"""
+Object storage client of the services
+
+The boto3 client is created on first use from the parameters given to
+configure(). use() replaces it with another client with the same methods.
+"""
+
+config = None
+client = None
+lock = threading.Lock()
+
+
+def configure(service_point, access_key, secret_key, **client_config):
+    """
+    Sets the connection parameters, the client is created on first use
+    :param client_config: botocore Config parameters
+    """
+    global config, client
+
+    config = {
+        'service_point': service_point,
+        'access_key': access_key,
+        'secret_key': secret_key,
+        'client_config': client_config,
+    }
+    client = None
+
+
+def use(s3client):
+    """
+    Replaces the client of the process
+    """
+    global client
+
+    client = s3client
+
+
+def get_client():
+    global client
+
+    if client is None:
+        with lock:
+            if client is None:
+                if config is None:
+                    raise Exception('storage.configure() must be called first')
+                import boto3
+                from botocore.client import Config
+
+                service_point = config['service_point']
+                client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
+                                      aws_access_key_id=config['access_key'],
+                                      aws_secret_access_key=config['secret_key'],
+                                      use_ssl=True if 'https' in service_point else False,
+                                      config=Config(**config['client_config']))
+                logging.info('object storage client created for {}'.format(service_point))
+
+    return client
+
+
+def is_missing(error):
+    """
+    Returns True for the error of an object that does not exist, NoSuchKey
+    or the 404 of a HEAD request
+    """
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
@@ -4,11 +4,9 @@ import random
 import sys
 from time import sleep
 
-import boto3
-import mysql.connector
+import helper_db
 import requests
-from botocore import UNSIGNED
-from botocore.client import Config
+import storage
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
@@ -16,29 +14,25 @@ logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 ## Vars init #
 ##############
 # Object storage
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['SERVICE_POINT']
-s3client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
-                        aws_access_key_id=access_key,
-                        aws_secret_access_key=secret_key,
-                        use_ssl=True if 'https' in service_point else False)
-
-s3sourceclient = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('SERVICE_POINT', '')
+storage.configure(service_point, access_key, secret_key)
 
 # Buckets
-bucket_source = os.environ['BUCKET_SOURCE']
+bucket_source = os.environ.get('BUCKET_SOURCE', '')
 bucket_source_name = bucket_source.split('/')[-1]
-bucket_destination = os.environ['BUCKET_BASE_NAME']
+bucket_destination = os.environ.get('BUCKET_BASE_NAME')
 
 # Helper database
-db_user = os.environ['DATABASE_USER']
-db_password = os.environ['DATABASE_PASSWORD']
-db_host = os.environ['DATABASE_HOST']
-db_db = os.environ['DATABASE_DB']
+db_user = os.environ.get('DATABASE_USER')
+db_password = os.environ.get('DATABASE_PASSWORD')
+db_host = os.environ.get('DATABASE_HOST')
+db_db = os.environ.get('DATABASE_DB')
+helper_db.configure(db_user, db_password, db_host, db_db, pool_size=1)
 
 # Delay between images
-seconds_wait = float(os.environ['SECONDS_WAIT'])
+seconds_wait = float(os.environ.get('SECONDS_WAIT', '0'))
 
 ########
 # Code #
@@ -52,46 +46,52 @@ def copy_file(source, image_key, destination, image_name):
     # Init File-like object (to be used by upload_fileobj method)
     file_object_from_req = req_for_file.raw
 
-    s3client.upload_fileobj(file_object_from_req,destination,image_name)
+    storage.get_client().upload_fileobj(file_object_from_req,destination,image_name)
 
 def update_images_uploaded(image_name):
     """Inserts image name and timestamp into the helper database."""
 
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO images_uploaded(time,name) SELECT CURRENT_TIMESTAMP(),"' + image_name + '";'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        helper_db.execute('INSERT INTO images_uploaded(time,name) SELECT CURRENT_TIMESTAMP(), %s',
+                          (image_name,))
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
-# Populate source images lists
-pneumonia_images=[]
-for image in s3sourceclient.list_objects(Bucket=bucket_source_name,Prefix='PNEUMONIA/')['Contents']:
-    pneumonia_images.append(image['Key'])
-normal_images=[]
-for image in s3sourceclient.list_objects(Bucket=bucket_source_name,Prefix='NORMAL/')['Contents']:
-    normal_images.append(image['Key'])
-
-# Main loop
-while seconds_wait != 0: #This allows the container to keep running but not send any image if parameter is set to 0
-    logging.info("copy image")
+def list_source_images(prefix):
+    """Returns the keys of the source images under a prefix, the source bucket is public."""
+
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.client import Config
+
+    s3sourceclient = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+    return [image['Key'] for image in
+            s3sourceclient.list_objects(Bucket=bucket_source_name, Prefix=prefix)['Contents']]
+
+def pick_image(normal_images, pneumonia_images):
     rand_type = random.randint(1,10)
     if rand_type <= 8: # 80% of time, choose a normal image
-        image_key = normal_images[random.randint(0,len(normal_images)-1)]
-    else:
-        image_key = pneumonia_images[random.randint(0,len(pneumonia_images)-1)]
-    image_name = image_key.split('/')[-1]
-    copy_file(bucket_source,image_key,bucket_destination,image_name)
-    update_images_uploaded(image_name)
-    sleep(seconds_wait)
-
-# Dirty hack to keep container running even when no images are to be copied
-os.system("tail -f /dev/null")
+        return normal_images[random.randint(0,len(normal_images)-1)]
+    return pneumonia_images[random.randint(0,len(pneumonia_images)-1)]
+
+def main():
+    # Populate source images lists
+    pneumonia_images = list_source_images('PNEUMONIA/')
+    normal_images = list_source_images('NORMAL/')
+
+    # Main loop
+    while seconds_wait != 0: #This allows the container to keep running but not send any image if parameter is set to 0
+        logging.info("copy image")
+        image_key = pick_image(normal_images, pneumonia_images)
+        image_name = image_key.split('/')[-1]
+        copy_file(bucket_source,image_key,bucket_destination,image_name)
+        update_images_uploaded(image_name)
+        sleep(seconds_wait)
+
+    # Dirty hack to keep container running even when no images are to be copied
+    os.system("tail -f /dev/null")
+
+if __name__ == '__main__':
+    main()
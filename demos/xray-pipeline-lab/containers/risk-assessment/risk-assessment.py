@@ -1,19 +1,26 @@
 import io
 import logging
 import os
-import gc
+import queue
+import re
+import signal
 import sys
+import threading
+import time
+from concurrent.futures import Future
 from hashlib import blake2b
 from io import BytesIO
 
-import boto3
 import numpy as np
-import tensorflow as tf
 from cloudevents.http import from_http
-from flask import Flask, request
+from flask import Flask, current_app, jsonify, request
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
 
-import mysql.connector
+import consumer
+import helper_db
+import notifications
+import serving
+import storage
 from flask_cors import CORS
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
@@ -22,50 +29,283 @@ logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 ## Vars init #
 ##############
 # Object storage
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
-s3client = boto3.client('s3','us-east-1', endpoint_url=service_point,
-                       aws_access_key_id = access_key,
-                       aws_secret_access_key = secret_key,
-                        use_ssl = True if 'https' in service_point else False)
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point', '')
+storage.configure(service_point, access_key, secret_key)
 
 # Bucket base name
-bucket_base_name = os.environ['bucket-base-name']
+bucket_base_name = os.environ.get('bucket-base-name')
 
 # Helper database
-db_user = os.environ['database-user']
-db_password = os.environ['database-password']
-db_host = os.environ['database-host']
-db_db = os.environ['database-db']
-
-# Inference model version
-model_version = os.environ['model_version']
+db_user = os.environ.get('database-user')
+db_password = os.environ.get('database-password')
+db_host = os.environ.get('database-host')
+db_db = os.environ.get('database-db')
+helper_db.configure(db_user, db_password, db_host, db_db,
+                    pool_size=int(os.environ.get('database-pool-size', '5')))
+
+# Counters are written to the helper database in the background
+metrics_writer = helper_db.MetricsWriter(
+    flush_rows=int(os.environ.get('metrics-flush-rows', '100')),
+    flush_interval_ms=int(os.environ.get('metrics-flush-interval-ms', '1000')))
+
+# Inference model version and location
+model_version = os.environ.get('model_version', 'v1')
+model_path = os.environ.get('model_path', './pneumonia_model.h5')
+# PUT /model is only served on this port, none by default, and only for the
+# versions listed when the list is set
+model_swap_port = os.environ.get('model_swap_port', '')
+model_versions = [version.strip() for version in os.environ.get('model_versions', '').split(',')
+                  if version.strip()]
+# A version is formatted into model_path, it must not change its directory
+MODEL_VERSION_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,31}')
+
+# Micro-batching of concurrent inferences
+batch_max_size = int(os.environ.get('batch_max_size', '16'))
+batch_max_latency_ms = float(os.environ.get('batch_max_latency_ms', '10'))
+
+# Number of records of a notification processed concurrently
+record_concurrency = int(os.environ.get('record_concurrency', '4'))
+
+# Event source: 'http' to receive the KafkaSource events, 'kafka' to consume
+# the topic directly, see consumer.py
+event_source = os.environ.get('event_source', 'http')
+kafka_bootstrap_servers = os.environ.get('kafka_bootstrap_servers', 'my-cluster-kafka-bootstrap.kafka:9092')
+kafka_topic = os.environ.get('kafka_topic', 'xray-images')
+kafka_group_id = os.environ.get('kafka_group_id', 'risk-assessment')
+kafka_max_poll_records = int(os.environ.get('kafka_max_poll_records', '100'))
+kafka_max_in_flight = int(os.environ.get('kafka_max_in_flight', '2'))
+# Records still failing after kafka_max_attempts go to the dead-letter topic,
+# they are only logged when it is empty
+kafka_max_attempts = int(os.environ.get('kafka_max_attempts', '3'))
+kafka_dead_letter_topic = os.environ.get('kafka_dead_letter_topic', '')
 
 ########
 # Code #
 ########
-# Main Flask app
-app = Flask(__name__)
-CORS(app)
+class ModelRegistry(object):
+    """Keeps the inference model loaded for the lifetime of the process.
+    The model is loaded on first use and reused by every event. Asking for
+    another version loads it and swaps it in place of the current one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.model = None
+        self.version = None
+        self.lock = threading.Lock()
+        self.inference_lock = threading.Lock()  # Keras models are not safe for concurrent calls
+        self.metrics = {
+            'model_version': None,
+            'model_loads': 0,
+            'model_load_seconds': 0.0,
+            'inferences': 0,
+            'inference_seconds_total': 0.0,
+            'inference_seconds_last': 0.0,
+        }
+
+    def get(self, version):
+        """Returns the model for version, loading it if it is not the current one."""
+        if self.model is None or self.version != version:
+            with self.lock:
+                if self.model is None or self.version != version:
+                    self.load(version)
+        return self.model
+
+    def load(self, version):
+        # path may contain a {version} placeholder to pick a file per version
+        import tensorflow as tf  # Imported with the first model, not with the module
+
+        start = time.perf_counter()
+        model = tf.keras.models.load_model(self.path.format(version=version))
+        load_time = time.perf_counter() - start
+        self.model = model
+        self.version = version
+        self.metrics['model_version'] = version
+        self.metrics['model_loads'] += 1
+        self.metrics['model_load_seconds'] = load_time
+        logging.info('model {} loaded in {:.3f}s'.format(version, load_time))
+
+    def predict(self, version, batch):
+        """Runs one forward pass on batch and records the inference time."""
+        model = self.get(version)
+        with self.inference_lock:
+            start = time.perf_counter()
+            pred = model.predict_on_batch(batch)
+            inference_time = time.perf_counter() - start
+        with self.lock:
+            self.metrics['inferences'] += 1
+            self.metrics['inference_seconds_total'] += inference_time
+            self.metrics['inference_seconds_last'] = inference_time
+        logging.info('inference made in {:.3f}s'.format(inference_time))
+        return pred
+
+class BatchPredictor(object):
+    """Aggregates concurrent predictions into micro-batches.
+    Each request queues its image and waits. A worker thread collects up to
+    max_batch_size images, or whatever arrived within max_latency_ms of the
+    first one, runs a single forward pass on the stacked batch and hands
+    every request back its own row of the result.
+    """
+
+    def __init__(self, registry, max_batch_size=16, max_latency_ms=10):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+        self.metrics = {
+            'batches': 0,
+            'batched_images': 0,
+            'batch_size_last': 0,
+        }
+
+    def start(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='batch-predictor', daemon=True)
+                self.worker.start()
+
+    def predict(self, version, image):
+        """Queues image, shape (1, height, width, channels), and waits for its prediction."""
+        self.start()
+        future = Future()
+        self.queue.put((version, image, future))
+        return future.result()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        # Requests made during a model swap may ask for different versions
+        versions = {}
+        for version, image, future in batch:
+            versions.setdefault(version, []).append((image, future))
+        for version, requests in versions.items():
+            try:
+                images = np.concatenate([image for image, _ in requests], axis=0)
+                pred = np.asarray(self.registry.predict(version, images))
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            for i, (_, future) in enumerate(requests):
+                future.set_result(pred[i:i+1])
+            self.metrics['batches'] += 1
+            self.metrics['batched_images'] += len(requests)
+            self.metrics['batch_size_last'] = len(requests)
+
+model_registry = ModelRegistry(model_path)
+batch_predictor = BatchPredictor(model_registry, batch_max_size, batch_max_latency_ms)
+
+def create_app(readiness=None):
+    """Returns the Flask application, /ready answers 200 once readiness is warm."""
+    app = Flask(__name__)
+    CORS(app)
+    app.config['READINESS'] = readiness
+    app.add_url_rule('/', 'home', home, methods=['POST'])
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+    app.add_url_rule('/live', 'live', live, methods=['GET'])
+    app.add_url_rule('/ready', 'ready', ready, methods=['GET'])
+    return app
+
+def create_management_app():
+    """Returns the Flask application of the management port, not routed by the Knative service."""
+    app = Flask(__name__)
+    app.add_url_rule('/model', 'swap_model', swap_model, methods=['PUT'])
+    return app
+
+def start_management_app():
+    thread = threading.Thread(target=create_management_app().run, name='management',
+                              kwargs={'host': '0.0.0.0', 'port': int(model_swap_port)},
+                              daemon=True)
+    thread.start()
+    logging.info('model swap served on port {}'.format(model_swap_port))
+
+def create_readiness():
+    # Client and model loaded before the service is ready, instead of at import
+    return serving.Readiness([
+        ('storage', storage.get_client),
+        ('database', helper_db.get_pool),
+        ('metrics', metrics_writer.start),
+        ('model', lambda: model_registry.get(model_version)),
+        ('batching', batch_predictor.start),
+    ])
 
-@app.route("/", methods=["POST"])
 def home():
     # Retrieve the CloudEvent
     event = from_http(request.headers, request.get_data())
     
-    # Process the event
-    process_event(event.data)
+    # Process all the records of the event
+    report = process_event(event.data)
+    if report['failed']:
+        return jsonify(report), 500
 
     return "", 204
 
+def metrics():
+    # Model load, inference, batching and metrics writer counters
+    return jsonify({**model_registry.metrics, **batch_predictor.metrics, **metrics_writer.metrics})
+
+def valid_model_version(version):
+    if not isinstance(version, str) or not MODEL_VERSION_PATTERN.fullmatch(version):
+        return False
+    return not model_versions or version in model_versions
+
+def swap_model():
+    # Hot-swap the inference model, e.g. {"model_version": "v2"}
+    global model_version
+    new_version = (request.get_json(force=True, silent=True) or {}).get('model_version')
+    if not valid_model_version(new_version):
+        return jsonify({'error': 'invalid model_version'}), 400
+    model_registry.get(new_version)
+    model_version = new_version
+    return jsonify(model_registry.metrics)
+
+def live():
+    return jsonify({'live': True})
+
+def ready():
+    # Startup time and warm-up steps
+    readiness = current_app.config['READINESS']
+    if readiness is None:
+        return jsonify({'ready': True})
+    status = readiness.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 def process_event(data):
     """Main function to process data received by the container image."""
 
     logging.info(data)
+    try:
+        records = [notifications.validate(record) for record in data['Records']]
+    except (KeyError, TypeError, notifications.NotificationError) as e:
+        logging.error(f"Invalid notification: {e}")
+        raise
+
+    return process_records(records)
+
+def process_records(records):
+    # Records are processed concurrently, their predictions are batched together
+    return notifications.process_batch(records, process_record, record_concurrency)
+
+def process_record(record):
     try:
         # Retrieve event info
-        extracted_data = extract_data(data)
+        extracted_data = extract_data(record)
         bucket_eventName = extracted_data['bucket_eventName']
         bucket_name = extracted_data['bucket_name']
         img_key = extracted_data['bucket_object']
@@ -73,32 +313,27 @@ def process_event(data):
         logging.info(bucket_eventName + ' ' + bucket_name + ' ' + img_key)
 
         if 's3:ObjectCreated' in bucket_eventName:
-            # Load image and make prediction
-            new_image = load_image(bucket_name,img_key)
+            computed_image_key = os.path.splitext(img_key)[0] + '-processed.' + os.path.splitext(img_key)[-1].strip('.')
+            # A notification delivered again is skipped for the images it already processed
+            if already_processed(bucket_name, img_key, computed_image_key):
+                logging.info('Image already processed')
+                return None
+
+            # Load image once and make prediction
+            img = load_image(bucket_name,img_key)
+            new_image = image_to_tensor(img)
             result = prediction(new_image)
             logging.info('result=' + result['label'])
 
-            # Get original image and print prediction on it
-            image_object = s3client.get_object(Bucket=bucket_name,Key=img_key)
-            img = Image.open(BytesIO(image_object['Body'].read()))
+            # Print prediction on the original image
             draw = ImageDraw.Draw(img)
             font = ImageFont.truetype('FreeMono.ttf', 50)
             draw.text((0, 0), result['label'], (255), font=font)
 
-            # Save image with "-processed" appended to name
-            computed_image_key = os.path.splitext(img_key)[0] + '-processed.' + os.path.splitext(img_key)[-1].strip('.')
-            buffer = BytesIO()
-            img.save(buffer, get_safe_ext(computed_image_key))
-            buffer.seek(0)
-            sent_data = s3client.put_object(Bucket=bucket_base_name+'-processed', Key=computed_image_key, Body=buffer)
-            if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
-                raise logging.error('Failed to upload image {} to bucket {}'.format(computed_image_key, bucket_base_name + '-processed'))
-            update_images_processed(computed_image_key,model_version,result['label'])
-            logging.info('Image processed')
-
             # If "unsure" of prediction, anonymize image
+            anonymized_image_key = None
             if (result['pred'] < 0.80 and  result['pred'] > 0.60):
-                anonymized_data = anonymize(img,img_name)
+                anonymized_data = anonymize(img.copy(),img_name)  # Blurred in place, img is saved as processed below
                 split_key = img_key.rsplit('/', 1)
                 if len(split_key) == 1:
                     anonymized_image_key = anonymized_data['anon_img_name']
@@ -108,33 +343,62 @@ def process_event(data):
                 buffer = BytesIO()
                 anonymized_img.save(buffer, get_safe_ext(anonymized_image_key))
                 buffer.seek(0)
-                sent_data = s3client.put_object(Bucket=bucket_base_name+'-anonymized', Key=anonymized_image_key, Body=buffer)
+                sent_data = storage.get_client().put_object(Bucket=bucket_base_name+'-anonymized', Key=anonymized_image_key, Body=buffer)
                 if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
                     raise logging.error('Failed to upload image {} to bucket {}'.format(anonymized_image_key, bucket_base_name+'-anonymized'))
-                update_images_anonymized(anonymized_image_key)
                 logging.info('Image anonymized')
 
+            # Save image with "-processed" appended to name, written last as
+            # it marks the image as processed
+            buffer = BytesIO()
+            img.save(buffer, get_safe_ext(computed_image_key))
+            buffer.seek(0)
+            sent_data = storage.get_client().put_object(Bucket=bucket_base_name+'-processed', Key=computed_image_key, Body=buffer)
+            if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
+                raise logging.error('Failed to upload image {} to bucket {}'.format(computed_image_key, bucket_base_name + '-processed'))
+            logging.info('Image processed')
+
+            update_images_processed(computed_image_key,model_version,result['label'])
+            if anonymized_image_key:
+                update_images_anonymized(anonymized_image_key)
+
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
-def extract_data(data):
+def extract_data(record):
     logging.info('extract_data')
-    record=data['Records'][0]
     bucket_eventName=record['eventName']
     bucket_name=record['s3']['bucket']['name']
     bucket_object=record['s3']['object']['key']
     data_out = {'bucket_eventName':bucket_eventName, 'bucket_name':bucket_name, 'bucket_object':bucket_object}
     return data_out
 
+def already_processed(bucket_name, img_key, computed_image_key):
+    """True when the processed image was written after the upload of the image, by an earlier delivery."""
+    client = storage.get_client()
+    try:
+        processed = client.head_object(Bucket=bucket_base_name+'-processed', Key=computed_image_key)
+    except Exception as e:
+        if storage.is_missing(e):
+            return False
+        raise
+    uploaded = client.head_object(Bucket=bucket_name, Key=img_key)
+    return processed['LastModified'] > uploaded['LastModified']
+
 def load_image(bucket_name, img_path):
+    """Fetches and decodes an image once, the model input and the annotated image both derive from it."""
     logging.info('load_image')
-    logging.info(bucket_name)
-    logging.info(img_path)
-    obj = s3client.get_object(Bucket=bucket_name, Key=img_path)
-    img_stream = io.BytesIO(obj['Body'].read())
-    img = tf.keras.preprocessing.image.load_img(img_stream, target_size=(150, 150))
-    img_tensor = tf.keras.preprocessing.image.img_to_array(img)                    # (height, width, channels)
+    obj = storage.get_client().get_object(Bucket=bucket_name, Key=img_path)
+    img = Image.open(BytesIO(obj['Body'].read()))
+    img.load()
+
+    return img
+
+def image_to_tensor(img):
+    # Same conversion as tf.keras.preprocessing.image.load_img(..., target_size=(150, 150))
+    model_img = img.convert('RGB').resize((150, 150), Image.NEAREST)
+    img_tensor = np.asarray(model_img, dtype=np.float32)    # (height, width, channels), as tf.keras.preprocessing.image.img_to_array
     img_tensor = np.expand_dims(img_tensor, axis=0)         # (1, height, width, channels), add a dimension because the model expects this shape: (batch_size, height, width, channels)
     img_tensor /= 255.                                      # imshow expects values in the range [0, 1]
 
@@ -143,10 +407,8 @@ def load_image(bucket_name, img_path):
 def prediction(new_image):
     logging.info('prediction')
     try:
-        model = tf.keras.models.load_model('./pneumonia_model.h5')
-        logging.info('model loaded')
-        pred = model.predict_on_batch(new_image)
-        pred_result = pred[0][0].numpy()
+        pred = batch_predictor.predict(model_version, new_image)
+        pred_result = pred[0][0]
         logging.info('prediction made')
         
         if pred_result > 0.80:
@@ -155,8 +417,6 @@ def prediction(new_image):
             label='Normal, risk=' + str(round(pred_result*100,2)) + '%'
         else:
             label='Unsure, risk=' + str(round(pred_result*100,2)) + '%'
-        tf.keras.backend.clear_session()
-        gc.collect()
     except Exception as e:
         logging.error(f"Prediction error: {e}")
         raise   
@@ -203,15 +463,8 @@ def get_safe_ext(key):
 
 def update_images_processed(image_name,model_version,label):
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO images_processed(time,name,model,label) SELECT CURRENT_TIMESTAMP(), "' + image_name + '","' + model_version + '","' + label.split(',')[0] + '";'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        metrics_writer.record('images_processed', name=image_name,
+                              model=model_version, label=label.split(',')[0])
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
@@ -219,15 +472,7 @@ def update_images_processed(image_name,model_version,label):
 
 def update_images_anonymized(image_name):
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO images_anonymized(time,name) SELECT CURRENT_TIMESTAMP(), "' + image_name + '";'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        metrics_writer.record('images_anonymized', name=image_name)
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
@@ -235,6 +480,25 @@ def update_images_anonymized(image_name):
 
 
 
+def main():
+    readiness = create_readiness()
+    if model_swap_port:
+        start_management_app()
+    if event_source == 'kafka':
+        readiness.warm()
+        consumer.consume(process_records, kafka_topic, kafka_bootstrap_servers, kafka_group_id,
+                         decode=notifications.decode,
+                         max_poll_records=kafka_max_poll_records,
+                         max_in_flight=kafka_max_in_flight,
+                         max_attempts=kafka_max_attempts,
+                         dead_letter_topic=kafka_dead_letter_topic)
+    else:
+        # Exit cleanly on SIGTERM so that pending counters are written
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        # Requests are answered while the model loads, /ready says when it is done
+        readiness.start()
+        create_app(readiness).run(host='0.0.0.0', threaded=True)
+
 # Launch Flask server
 if __name__ == '__main__':
-    app.run(host='0.0.0.0')
+    main()
@@ -1,37 +1,108 @@
-import http.server
 import io
 import json
 import logging
 import os
 import random
-import socketserver
 import sys
+import threading
+import time
 from hashlib import blake2b
 from io import BytesIO
 
-import boto3
+import consumer
+import serving
+import storage
 import numpy as np
-import tensorflow as tf
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
 from cloudevents.sdk import marshaller
 from cloudevents.sdk.event import v02
 
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point', '')
+
+# Serving mode, see serving.py
+serving_mode = os.environ.get('serving_mode', 'thread')
+serving_workers = int(os.environ.get('serving_workers', '4'))
+
+# Event source: 'http' to receive the KafkaSource events, 'kafka' to consume
+# the topic directly, see consumer.py
+event_source = os.environ.get('event_source', 'http')
+kafka_bootstrap_servers = os.environ.get('kafka_bootstrap_servers', 'my-cluster-kafka-bootstrap.kafka:9092')
+kafka_topic = os.environ.get('kafka_topic', 'storage')
+kafka_group_id = os.environ.get('kafka_group_id', 'xray')
+kafka_max_poll_records = int(os.environ.get('kafka_max_poll_records', '100'))
+kafka_max_in_flight = int(os.environ.get('kafka_max_in_flight', '2'))
+# Records still failing after kafka_max_attempts go to the dead-letter topic,
+# they are only logged when it is empty
+kafka_max_attempts = int(os.environ.get('kafka_max_attempts', '3'))
+kafka_dead_letter_topic = os.environ.get('kafka_dead_letter_topic', '')
+
+model_path = os.environ.get('model_path', './pneumonia_model.h5')
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-s3client = boto3.client('s3','us-east-1', endpoint_url=service_point,
-                       aws_access_key_id = access_key,
-                       aws_secret_access_key = secret_key,
-                        use_ssl = True if 'https' in service_point else False)
+storage.configure(service_point, access_key, secret_key)
 
-m = marshaller.NewDefaultHTTPMarshaller()
 
+class ModelRegistry(object):
+    """Keeps the inference model loaded for the lifetime of the process.
+    The model is loaded on first use and reused by every event. Asking for
+    another version loads it and swaps it in place of the current one.
+    """
 
-class ForkedHTTPServer(socketserver.ForkingMixIn, http.server.HTTPServer):
-    """Handle requests with fork."""
+    def __init__(self, path):
+        self.path = path
+        self.model = None
+        self.version = None
+        self.lock = threading.Lock()
+        self.inference_lock = threading.Lock()  # Keras models are not safe for concurrent calls
+        self.metrics = {
+            'model_version': None,
+            'model_loads': 0,
+            'model_load_seconds': 0.0,
+            'inferences': 0,
+            'inference_seconds_total': 0.0,
+            'inference_seconds_last': 0.0,
+        }
+
+    def get(self, version=None):
+        """Returns the model for version, loading it if it is not the current one."""
+        if self.model is None or self.version != version:
+            with self.lock:
+                if self.model is None or self.version != version:
+                    self.load(version)
+        return self.model
+
+    def load(self, version):
+        # path may contain a {version} placeholder to pick a file per version
+        import tensorflow as tf  # Imported with the first model, not with the module
+
+        start = time.perf_counter()
+        model = tf.keras.models.load_model(self.path.format(version=version))
+        load_time = time.perf_counter() - start
+        self.model = model
+        self.version = version
+        self.metrics['model_version'] = version
+        self.metrics['model_loads'] += 1
+        self.metrics['model_load_seconds'] = load_time
+        logging.info('model {} loaded in {:.3f}s'.format(version, load_time))
+
+    def predict(self, version, batch):
+        """Runs one forward pass on batch and records the inference time."""
+        model = self.get(version)
+        with self.inference_lock:
+            start = time.perf_counter()
+            pred = model.predict(batch)
+            inference_time = time.perf_counter() - start
+        with self.lock:
+            self.metrics['inferences'] += 1
+            self.metrics['inference_seconds_total'] += inference_time
+            self.metrics['inference_seconds_last'] = inference_time
+        logging.info('inference made in {:.3f}s'.format(inference_time))
+        return pred
+
+model_registry = ModelRegistry(model_path)
 
 
 class CloudeventsServer(object):
@@ -39,15 +110,22 @@ class CloudeventsServer(object):
     cloudevents request is simply a HTTP Post request following a well-defined
     of how to pass the event data.
     """
-    def __init__(self, port=8080):
+    def __init__(self, port=8080, mode='thread', workers=4, on_shutdown=None,
+                 readiness=None):
         self.port = port
+        self.mode = mode
+        self.workers = workers
+        self.on_shutdown = on_shutdown
+        self.readiness = readiness
 
     def start_receiver(self, func):
         """Start listening to HTTP requests
         :param func: the callback to call upon a cloudevents request
         :type func: cloudevent -> none
         """
-        class BaseHttp(http.server.BaseHTTPRequestHandler):
+        m = marshaller.NewDefaultHTTPMarshaller()
+
+        class BaseHttp(serving.ProbeHandler):
             def do_POST(self):
                 logging.info('POST received')
                 content_type = self.headers.get('Content-Type')
@@ -75,14 +153,15 @@ class CloudeventsServer(object):
                 self.end_headers()
                 return
 
-        socketserver.TCPServer.allow_reuse_address = True
-        with ForkedHTTPServer(("", self.port), BaseHttp) as httpd:
-            try:
-                logging.info("serving at port {}".format(self.port))
-                httpd.serve_forever()
-            except:
-                httpd.server_close()
-                raise
+            def do_GET(self):
+                # Model load and inference timings, or the probes
+                if self.path != '/metrics':
+                    return super().do_GET()
+                self.send_json(200, model_registry.metrics)
+
+        serving.serve(self.port, BaseHttp, mode=self.mode,
+                      workers=self.workers, on_shutdown=self.on_shutdown,
+                      readiness=self.readiness)
 
 def extract_data(msg):
     logging.info('extract_data')
@@ -93,10 +172,18 @@ def extract_data(msg):
     return data
 
 def load_image(bucket_name, img_path):
+    """Fetches and decodes an image once, the model input and the annotated image both derive from it."""
     logging.info('load_image')
-    obj = s3client.get_object(Bucket=bucket_name, Key=img_path)
-    img = tf.keras.preprocessing.image.load_img(BytesIO(obj['Body'].read()), target_size=(150, 150))
-    img_tensor = tf.keras.preprocessing.image.img_to_array(img)                    # (height, width, channels)
+    obj = storage.get_client().get_object(Bucket=bucket_name, Key=img_path)
+    img = Image.open(BytesIO(obj['Body'].read()))
+    img.load()
+
+    return img
+
+def image_to_tensor(img):
+    # Same conversion as tf.keras.preprocessing.image.load_img(..., target_size=(150, 150))
+    model_img = img.convert('RGB').resize((150, 150), Image.NEAREST)
+    img_tensor = np.asarray(model_img, dtype=np.float32)    # (height, width, channels), as tf.keras.preprocessing.image.img_to_array
     img_tensor = np.expand_dims(img_tensor, axis=0)         # (1, height, width, channels), add a dimension because the model expects this shape: (batch_size, height, width, channels)
     img_tensor /= 255.                                      # imshow expects values in the range [0, 1]
 
@@ -105,9 +192,7 @@ def load_image(bucket_name, img_path):
 def prediction(new_image):
     logging.info('prediction')
     try:
-        model = tf.keras.models.load_model('./pneumonia_model.h5')
-        logging.info('model loaded')
-        pred = model.predict(new_image)
+        pred = model_registry.predict(None, new_image)
         logging.info('prediction made')
     
         if pred[0][0] > 0.80:
@@ -161,23 +246,42 @@ def get_safe_ext(key):
         logging.error('Extension is invalid')   
 
 def run_event(event):
-    logging.info(event.Data())
+    process_message(event.Data())
+
+def process_messages(messages):
+    # Batch handler of the Kafka consumer, a failed message does not stop
+    # the others and only the failed ones are retried
+    report = {'processed': {}, 'failed': {}}
+    for msg in messages:
+        name = consumer.record_name(msg)
+        try:
+            process_message(msg)
+            report['processed'][name] = None
+        except Exception as e:
+            if storage.is_missing(e):
+                # Deleted since the message was produced, nothing to process
+                report['processed'][name] = None
+            else:
+                report['failed'][name] = str(e)
+    return report
+
+def process_message(msg):
+    logging.info(msg)
     try:
-        extracted_data = extract_data(event.Data())
+        extracted_data = extract_data(msg)
         bucket_eventName = extracted_data['bucket_eventName']
         bucket_name = extracted_data['bucket_name']
         img_key = extracted_data['bucket_object']
         logging.info(bucket_eventName + ' ' + bucket_name + ' ' + img_key)
 
         if bucket_eventName == 's3:ObjectCreated:Put':
-            # Load image and make prediction
-            new_image = load_image(bucket_name,img_key)
+            # Load image once and make prediction
+            img = load_image(bucket_name,img_key)
+            new_image = image_to_tensor(img)
             result = prediction(new_image)
             logging.info('result=' + result['label'])
 
-            # Get original image and print prediction on it
-            image_object = s3client.get_object(Bucket=bucket_name,Key=img_key)
-            img = Image.open(BytesIO(image_object['Body'].read()))
+            # Print prediction on the original image
             draw = ImageDraw.Draw(img)
             font = ImageFont.truetype('FreeMono.ttf', 50)
             draw.text((0, 0), result['label'], (255), font=font)
@@ -187,7 +291,7 @@ def run_event(event):
             buffer = BytesIO()
             img.save(buffer, get_safe_ext(computed_image_key))
             buffer.seek(0)
-            sent_data = s3client.put_object(Bucket=bucket_name+'-processed', Key=computed_image_key, Body=buffer)
+            sent_data = storage.get_client().put_object(Bucket=bucket_name+'-processed', Key=computed_image_key, Body=buffer)
             if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
                 raise logging.error('Failed to upload image {} to bucket {}'.format(computed_image_key, bucket_name + '-processed'))
 
@@ -205,7 +309,7 @@ def run_event(event):
                 buffer = BytesIO()
                 anonymized_img.save(buffer, get_safe_ext(anonymized_image_key))
                 buffer.seek(0)
-                sent_data = s3client.put_object(Bucket=bucket_name+'-anonymized', Key=anonymized_image_key, Body=buffer)
+                sent_data = storage.get_client().put_object(Bucket=bucket_name+'-anonymized', Key=anonymized_image_key, Body=buffer)
                 if sent_data['ResponseMetadata']['HTTPStatusCode'] != 200:
                     raise logging.error('Failed to upload image {} to bucket {}'.format(anonymized_image_key, bucket_name + '-anonymized'))
 
@@ -214,5 +318,28 @@ def run_event(event):
         raise
 
 
-client = CloudeventsServer()
-client.start_receiver(run_event)
+def create_readiness():
+    # Client and model loaded before the service is ready, instead of at import
+    return serving.Readiness([
+        ('storage', storage.get_client),
+        ('model', model_registry.get),
+    ])
+
+def create_app():
+    """Returns the receiver of the service, warmed up when it starts serving."""
+    return CloudeventsServer(mode=serving_mode, workers=serving_workers,
+                             readiness=create_readiness())
+
+def main():
+    if event_source == 'kafka':
+        create_readiness().warm()
+        consumer.consume(process_messages, kafka_topic, kafka_bootstrap_servers, kafka_group_id,
+                         max_poll_records=kafka_max_poll_records,
+                         max_in_flight=kafka_max_in_flight,
+                         max_attempts=kafka_max_attempts,
+                         dead_letter_topic=kafka_dead_letter_topic)
+    else:
+        create_app().start_receiver(run_event)
+
+if __name__ == '__main__':
+    main()
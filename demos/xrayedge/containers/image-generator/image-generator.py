@@ -4,46 +4,36 @@ import random
 import sys
 from time import sleep
 
-import boto3
+import helper_db
+import storage
 
-import mysql.connector
+access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+service_point = os.environ.get('service_point', '')
 
-access_key = os.environ['AWS_ACCESS_KEY_ID']
-secret_key = os.environ['AWS_SECRET_ACCESS_KEY']
-service_point = os.environ['service_point']
+db_user = os.environ.get('database-user')
+db_password = os.environ.get('database-password')
+db_host = os.environ.get('database-host')
+db_db = os.environ.get('database-db')
+helper_db.configure(db_user, db_password, db_host, db_db, pool_size=1)
 
-db_user = os.environ['database-user']
-db_password = os.environ['database-password']
-db_host = os.environ['database-host']
-db_db = os.environ['database-db']
-
-seconds_wait = float(os.environ['seconds_wait'])
+seconds_wait = float(os.environ.get('seconds_wait', '0'))
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-s3client = boto3.client('s3', 'us-east-1', endpoint_url=service_point,
-                        aws_access_key_id=access_key,
-                        aws_secret_access_key=secret_key,
-                        use_ssl=True if 'https' in service_point else False)
+storage.configure(service_point, access_key, secret_key)
 
 def copy_file(source, image_key, destination, image_name):
     copy_source = {
         'Bucket': source,
         'Key': image_key
     }
-    s3client.copy(copy_source, destination, image_name)
+    storage.get_client().copy(copy_source, destination, image_name)
 
 def update_images_uploaded(image_name):
     try:
-        cnx = mysql.connector.connect(user=db_user, password=db_password,
-                                      host=db_host,
-                                      database=db_db)
-        cursor = cnx.cursor()
-        query = 'INSERT INTO images_uploaded(time,name) SELECT CURRENT_TIMESTAMP(),"' + image_name + '";'
-        cursor.execute(query)
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        helper_db.execute('INSERT INTO images_uploaded(time,name) SELECT CURRENT_TIMESTAMP(), %s',
+                          (image_name,))
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
@@ -53,26 +43,30 @@ def update_images_uploaded(image_name):
 bucket_source = 'chest-xray'
 bucket_destination = 'xrayedge-in'
 
-# Read source images lists
-pneumonia_images=[]
-for image in s3client.list_objects(Bucket=bucket_source,Prefix='demo_base/PNEUMONIA/')['Contents']:
-    pneumonia_images.append(image['Key'])
-normal_images=[]
-for image in s3client.list_objects(Bucket=bucket_source,Prefix='demo_base/NORMAL/')['Contents']:
-    normal_images.append(image['Key'])
+def list_images(prefix):
+    return [image['Key'] for image in
+            storage.get_client().list_objects(Bucket=bucket_source, Prefix=prefix)['Contents']]
+
+def main():
+    # Read source images lists
+    pneumonia_images = list_images('demo_base/PNEUMONIA/')
+    normal_images = list_images('demo_base/NORMAL/')
+
+    # Main loop
+    while seconds_wait != 0:
+        print("copy image")
+        rand_type = random.randint(1,10)
+        if rand_type <= 8: # 80% of time, choose a normal image
+            image_key = normal_images[random.randint(0,len(normal_images)-1)]
+        else:
+            image_key = pneumonia_images[random.randint(0,len(pneumonia_images)-1)]
+        image_name = image_key.split('/')[-1]
+        copy_file(bucket_source,image_key,bucket_destination,image_name)
+        update_images_uploaded(image_name)
+        sleep(seconds_wait)
 
-# Main loop
-while seconds_wait != 0:
-    print("copy image")
-    rand_type = random.randint(1,10)
-    if rand_type <= 8: # 80% of time, choose a normal image
-        image_key = normal_images[random.randint(0,len(normal_images)-1)]
-    else:
-        image_key = pneumonia_images[random.randint(0,len(pneumonia_images)-1)]
-    image_name = image_key.split('/')[-1]
-    copy_file(bucket_source,image_key,bucket_destination,image_name)
-    update_images_uploaded(image_name)
-    sleep(seconds_wait)
+    # Dirty hack to keep container running even when no images are to be copied
+    os.system("tail -f /dev/null")
 
-# Dirty hack to keep container running even when no images are to be copied
-os.system("tail -f /dev/null")
+if __name__ == '__main__':
+    main()